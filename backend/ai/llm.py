@@ -303,14 +303,17 @@ class LLMClient:
         # 构建 API 消息
         api_messages = self.build_api_messages(messages, system_prompt, False)
 
-        # 流式调用
-        async for pev in provider.stream(
-            api_messages, actual_model,
-            temperature=temperature, max_tokens=max_tokens,
-            tools=tools, tool_choice=tool_choice,
-            request_id=request_id,
-        ):
-            yield self._convert_provider_event(pev)
+        # 流式调用 (Provider 抛出的错误, 如并发名额排队超时, 转为 error 事件)
+        try:
+            async for pev in provider.stream(
+                api_messages, actual_model,
+                temperature=temperature, max_tokens=max_tokens,
+                tools=tools, tool_choice=tool_choice,
+                request_id=request_id,
+            ):
+                yield self._convert_provider_event(pev)
+        except ProviderError as e:
+            yield LLMEvent("error", error=str(e), error_meta=e.error_meta)
 
     async def _stream_reasoning(
         self,
@@ -417,11 +420,11 @@ class LLMClient:
                             name=pev.name,
                             arguments_delta=pev.arguments_delta)
         elif pev.type == EventType.USAGE:
-            return LLMEvent("usage", usage=pev.usage)
+            return LLMEvent("usage", usage=pev.usage or {})
         elif pev.type == EventType.FINISH:
             return LLMEvent("finish", finish_reason=pev.finish_reason)
         elif pev.type == EventType.ERROR:
-            return LLMEvent("error", error=pev.error, error_meta=pev.error_meta)
+            return LLMEvent("error", error=pev.error, error_meta=pev.error_meta or {})
         else:
             return LLMEvent("unknown", raw=str(pev))
 
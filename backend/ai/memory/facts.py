@@ -295,13 +295,10 @@ class FactExtractor:
             # 向量相似度去重 (cosine > 0.92)
             is_dup = False
             try:
-                from backend.ai.rag.embeddings import get_embedding_service, cosine_similarity
+                from backend.ai.rag.embeddings import get_embedding_service, cosine_batch
                 svc = get_embedding_service()
                 item_emb = await svc.embed_text(item["content"])
-                for ee in existing_embeddings:
-                    if ee and cosine_similarity(item_emb, ee) > 0.92:
-                        is_dup = True
-                        break
+                is_dup = any(sim > 0.92 for sim in cosine_batch(item_emb, existing_embeddings))
             except Exception:
                 pass
 
@@ -44,9 +44,9 @@ class MemoryStore:
         # 生成 embedding (graceful degradation)
         embedding = None
         try:
-            from backend.ai.rag.embeddings import get_embedding_service
+            from backend.ai.rag.embeddings import get_embedding_service, quantize_int8
             svc = get_embedding_service()
-            embedding = await svc.embed_text(content)
+            embedding = quantize_int8(await svc.embed_text(content))
         except Exception as e:
             logger.debug(f"embedding 生成失败 (退化到纯关键词): {e}")
 
@@ -129,13 +129,16 @@ class MemoryStore:
             keywords = [w.lower() for w in query.split() if len(w) > 1] if query else []
             now = time.time()
 
+            # 向量相似度: 候选集一次批量计算
+            vec_scores = [0.0] * len(rows)
+            if query_emb:
+                from backend.ai.rag.embeddings import cosine_batch
+                vec_scores = cosine_batch(query_emb, [item.embedding for item in rows])
+
             scored: list[tuple[float, MemoryItemModel]] = []
-            for item in rows:
+            for item, sim in zip(rows, vec_scores):
                 # 向量相似度
-                vec_score = 0.0
-                if query_emb and item.embedding:
-                    from backend.ai.rag.embeddings import cosine_similarity
-                    vec_score = max(0.0, cosine_similarity(query_emb, item.embedding))
+                vec_score = max(0.0, sim)
 
                 # 关键词命中率
                 kw_score = 0.0
@@ -241,9 +244,9 @@ class MemoryStore:
         """更新内容 + 重新生成 embedding"""
         embedding = None
         try:
-            from backend.ai.rag.embeddings import get_embedding_service
+            from backend.ai.rag.embeddings import get_embedding_service, quantize_int8
             svc = get_embedding_service()
-            embedding = await svc.embed_text(content)
+            embedding = quantize_int8(await svc.embed_text(content))
         except Exception:
             pass
 
@@ -14,6 +14,9 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import queue
+import sqlite3
+import threading
 import time
 import uuid
 from collections import deque
@@ -44,9 +47,11 @@ class TraceSpan:
     model_id: str = ""
     project_id: str = ""
 
-    # 时间
+    # 时间 (start_time/end_time 为墙钟时间, 仅用于展示; 耗时用单调时钟计算)
     start_time: float = 0.0
     end_time: float = 0.0
+    start_ns: int = 0
+    end_ns: int = 0
 
     # Token 用量
     prompt_tokens: int = 0
@@ -60,11 +65,13 @@ class TraceSpan:
     status: str = "ok"  # ok / error / timeout
     error_message: str = ""
 
-    # 元数据
-    metadata: Dict[str, Any] = field(default_factory=dict)
+    # 元数据 (默认 None, 避免每个 span 分配空 dict)
+    metadata: Optional[Dict[str, Any]] = None
 
     @property
     def duration_ms(self) -> float:
+        if self.end_ns and self.start_ns:
+            return (self.end_ns - self.start_ns) / 1e6
         if self.end_time and self.start_time:
             return (self.end_time - self.start_time) * 1000
         return 0.0
@@ -87,7 +94,7 @@ class TraceSpan:
             "estimated_cost_cents": round(self.estimated_cost_cents, 4),
             "status": self.status,
             "error_message": self.error_message,
-            "metadata": self.metadata,
+            "metadata": self.metadata or {},
         }
 
 
@@ -135,18 +142,96 @@ def estimate_cost(model_id: str, prompt_tokens: int, completion_tokens: int) ->
     return cost_usd * 100  # → cents
 
 
+_STOP = object()  # 写入线程退出哨兵
+
+# SQL 固定为模块常量: sqlite3 按语句文本缓存预编译结果, 写入线程的长连接上
+# 每个批次都命中同一条 prepared statement。
+_CREATE_TRACES_SQL = """
+    CREATE TABLE IF NOT EXISTS ai_traces (
+        span_id TEXT PRIMARY KEY,
+        trace_id TEXT,
+        parent_id TEXT,
+        trace_type TEXT,
+        name TEXT,
+        model_id TEXT,
+        project_id TEXT,
+        start_time REAL,
+        end_time REAL,
+        duration_ms REAL,
+        prompt_tokens INTEGER,
+        completion_tokens INTEGER,
+        total_tokens INTEGER,
+        estimated_cost_cents REAL,
+        status TEXT,
+        error_message TEXT,
+        metadata TEXT
+    )
+"""
+
+_CREATE_TRACES_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS ai_traces_proj_time
+    ON ai_traces (project_id, start_time DESC)
+"""
+
+_INSERT_TRACE_SQL = """
+    INSERT OR REPLACE INTO ai_traces
+    (span_id, trace_id, parent_id, trace_type, name,
+     model_id, project_id, start_time, end_time, duration_ms,
+     prompt_tokens, completion_tokens, total_tokens,
+     estimated_cost_cents, status, error_message, metadata)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _span_row(span: TraceSpan) -> tuple:
+    """TraceSpan → _INSERT_TRACE_SQL 的位置参数"""
+    return (
+        span.span_id,
+        span.trace_id,
+        span.parent_id,
+        span.trace_type.value,
+        span.name,
+        span.model_id,
+        span.project_id,
+        span.start_time,
+        span.end_time,
+        span.duration_ms,
+        span.prompt_tokens,
+        span.completion_tokens,
+        span.total_tokens,
+        span.estimated_cost_cents,
+        span.status,
+        span.error_message,
+        json.dumps(span.metadata or {}),
+    )
+
+
 class Tracer:
     """
     请求追踪器
 
-    维护内存环形缓冲 + 异步写入 SQLite。
+    维护内存环形缓冲 + 后台线程写入 SQLite。
+
+    end_span 只做 deque.append + SimpleQueue.put (均不阻塞), 持久化在独立的
+    daemon 线程中用同步 sqlite3 + executemany 批量完成, 不占用事件循环。
+    未结束的 span 超过 SPAN_TIMEOUT_SECONDS 会被按 timeout 强制结束, 避免请求中途取消
+    (未调用 end_span) 时 _active_spans 无限增长: 写入线程只负责找出超时的 span id,
+    实际的 pop / 写入缓冲交回事件循环线程执行 (_buffer / _active_spans 只在事件循环中修改)。
     """
 
+    SPAN_TIMEOUT_SECONDS = 300
+    SWEEP_INTERVAL_SECONDS = 60
+
+    # ai_traces 表结构只需在进程内初始化一次
+    _schema_ready = False
+
     def __init__(self, buffer_size: int = 1000):
         self._buffer: deque[TraceSpan] = deque(maxlen=buffer_size)
         self._active_spans: Dict[str, TraceSpan] = {}
-        self._write_queue: asyncio.Queue[TraceSpan] = asyncio.Queue()
-        self._writer_task: Optional[asyncio.Task] = None
+        self._write_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_sweep = time.time()
 
     def start_span(
         self,
@@ -167,7 +252,8 @@ class Tracer:
             model_id=model_id,
             project_id=project_id,
             start_time=time.time(),
-            metadata=metadata or {},
+            start_ns=time.monotonic_ns(),
+            metadata=metadata or None,
         )
         self._active_spans[span.span_id] = span
         return span
@@ -181,6 +267,7 @@ class Tracer:
         error_message: str = "",
     ):
         """结束一个 span"""
+        span.end_ns = time.monotonic_ns()
         span.end_time = time.time()
         span.prompt_tokens = prompt_tokens
         span.completion_tokens = completion_tokens
@@ -191,30 +278,58 @@ class Tracer:
             span.model_id, prompt_tokens, completion_tokens
         )
 
-        self._active_spans.pop(span.span_id, None)
-        self._buffer.append(span)
+        # 已被超时回收的 span 仍在缓冲中 (同一对象, 上面已原地更新), 不再重复加入;
+        # 仍交给写入线程, 以正常结束的结果覆盖数据库中的 timeout 行 (INSERT OR REPLACE)
+        if self._active_spans.pop(span.span_id, None) is not None:
+            self._buffer.append(span)
 
-        # 异步写入队列
-        try:
-            self._write_queue.put_nowait(span)
-        except asyncio.QueueFull:
-            pass
+        # 交给后台写入线程 (SimpleQueue 无界, put 不阻塞)
+        self._write_queue.put(span)
 
     def get_recent(self, limit: int = 50, project_id: Optional[str] = None) -> List[dict]:
-        """获取最近的 trace"""
-        spans = list(self._buffer)
-        if project_id:
-            spans = [s for s in spans if s.project_id == project_id]
-        spans = spans[-limit:]
-        return [s.to_dict() for s in reversed(spans)]
+        """获取最近的 trace (从新到旧遍历, 凑够 limit 即停, 不复制整个缓冲)"""
+        result: List[dict] = []
+        if limit <= 0:
+            return result
+        for s in reversed(self._buffer):
+            if project_id and s.project_id != project_id:
+                continue
+            result.append(s.to_dict())
+            if len(result) >= limit:
+                break
+        return result
 
     def get_stats(self, project_id: Optional[str] = None) -> dict:
-        """获取汇总统计"""
-        spans = list(self._buffer)
-        if project_id:
-            spans = [s for s in spans if s.project_id == project_id]
+        """获取汇总统计 (单次遍历累加, 不生成中间列表)"""
+        total_calls = 0
+        total_tokens = 0
+        total_cost = 0.0
+        duration_sum = 0.0
+        duration_count = 0
+        errors = 0
+        by_model: Dict[str, dict] = {}
 
-        if not spans:
+        for s in self._buffer:
+            if project_id and s.project_id != project_id:
+                continue
+            total_calls += 1
+            total_tokens += s.total_tokens
+            total_cost += s.estimated_cost_cents
+            duration = s.duration_ms
+            if duration > 0:
+                duration_sum += duration
+                duration_count += 1
+            if s.status == "error":
+                errors += 1
+
+            model_stats = by_model.get(s.model_id)
+            if model_stats is None:
+                model_stats = by_model[s.model_id] = {"calls": 0, "tokens": 0, "cost_cents": 0}
+            model_stats["calls"] += 1
+            model_stats["tokens"] += s.total_tokens
+            model_stats["cost_cents"] += s.estimated_cost_cents
+
+        if not total_calls:
             return {
                 "total_calls": 0,
                 "total_tokens": 0,
@@ -224,126 +339,132 @@ class Tracer:
                 "by_model": {},
             }
 
-        total_tokens = sum(s.total_tokens for s in spans)
-        total_cost = sum(s.estimated_cost_cents for s in spans)
-        durations = [s.duration_ms for s in spans if s.duration_ms > 0]
-        errors = sum(1 for s in spans if s.status == "error")
-
-        by_model: Dict[str, dict] = {}
-        for s in spans:
-            if s.model_id not in by_model:
-                by_model[s.model_id] = {"calls": 0, "tokens": 0, "cost_cents": 0}
-            by_model[s.model_id]["calls"] += 1
-            by_model[s.model_id]["tokens"] += s.total_tokens
-            by_model[s.model_id]["cost_cents"] += s.estimated_cost_cents
-
         return {
-            "total_calls": len(spans),
+            "total_calls": total_calls,
             "total_tokens": total_tokens,
             "total_cost_cents": round(total_cost, 2),
-            "avg_duration_ms": round(sum(durations) / len(durations), 1) if durations else 0,
+            "avg_duration_ms": round(duration_sum / duration_count, 1) if duration_count else 0,
             "error_count": errors,
             "by_model": by_model,
         }
 
     async def start_writer(self):
-        """启动后台写入任务"""
-        if self._writer_task is not None:
+        """启动后台写入线程"""
+        if self._writer_thread is not None:
             return
-        self._writer_task = asyncio.create_task(self._write_loop())
+        self._loop = asyncio.get_running_loop()
+        self._writer_thread = threading.Thread(
+            target=self._write_loop, name="trace-writer", daemon=True,
+        )
+        self._writer_thread.start()
 
     async def stop_writer(self):
-        """停止后台写入"""
-        if self._writer_task:
-            self._writer_task.cancel()
-            try:
-                await self._writer_task
-            except asyncio.CancelledError:
-                pass
-            self._writer_task = None
-
-    async def _write_loop(self):
-        """后台写入循环"""
-        while True:
-            spans_to_write: List[TraceSpan] = []
-            try:
-                # 等待第一个
-                span = await self._write_queue.get()
-                spans_to_write.append(span)
+        """停止后台写入 (写完队列中剩余的 span 后退出)"""
+        thread = self._writer_thread
+        if thread is None:
+            return
+        self._write_queue.put(_STOP)
+        await asyncio.get_running_loop().run_in_executor(None, thread.join, 5.0)
+        self._writer_thread = None
+
+    def _stale_span_ids(self, now: float) -> List[str]:
+        """超时未关闭的 span id (只读; 可在写入线程调用, 先对字典做快照)"""
+        deadline = now - self.SPAN_TIMEOUT_SECONDS
+        return [sid for sid, s in list(self._active_spans.items()) if s.start_time < deadline]
+
+    def _expire_spans(self, span_ids: List[str], now: float) -> int:
+        """按 timeout 强制结束给定的 span, 返回清理数量
+
+        由写入线程经 call_soon_threadsafe 交给事件循环执行, 与 get_recent / get_stats 不会并发。
+        """
+        count = 0
+        for sid in span_ids:
+            span = self._active_spans.pop(sid, None)
+            if span is None:
+                continue
+            span.end_ns = time.monotonic_ns()
+            span.end_time = now
+            span.status = "timeout"
+            span.error_message = span.error_message or "span 未正常结束 (超时回收)"
+            self._buffer.append(span)
+            self._write_queue.put(span)
+            count += 1
+        if count:
+            logger.debug("回收 %d 个超时 span", count)
+        return count
+
+    def _write_loop(self):
+        """后台写入循环 (写入线程; 空闲时按 SWEEP_INTERVAL_SECONDS 周期回收超时 span)"""
+        conn: Optional[sqlite3.Connection] = None
+        stopping = False
+        try:
+            while not stopping:
+                now = time.time()
+                if now - self._last_sweep >= self.SWEEP_INTERVAL_SECONDS:
+                    self._last_sweep = now
+                    expired = self._stale_span_ids(now)
+                    if expired and self._loop is not None:
+                        try:
+                            self._loop.call_soon_threadsafe(self._expire_spans, expired, now)
+                        except RuntimeError:  # 事件循环已关闭: 进程退出中, 无需回收
+                            pass
+                # 等待第一个 (带超时, 保证空闲时也能触发回收)
+                try:
+                    item = self._write_queue.get(timeout=self.SWEEP_INTERVAL_SECONDS)
+                except queue.Empty:
+                    continue
+                if item is _STOP:
+                    break
+                spans_to_write: List[TraceSpan] = [item]
                 # 批量收集更多
-                while not self._write_queue.empty() and len(spans_to_write) < 50:
-                    spans_to_write.append(self._write_queue.get_nowait())
-            except asyncio.CancelledError:
-                break
+                while len(spans_to_write) < 50:
+                    try:
+                        item = self._write_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    spans_to_write.append(item)
 
-            if spans_to_write:
                 try:
-                    await self._persist_spans(spans_to_write)
+                    if conn is None:
+                        conn = self._connect()
+                    self._persist_spans(conn, spans_to_write)
                 except Exception as e:
                     logger.warning("Trace 写入失败: %s", e)
-
-    async def _persist_spans(self, spans: List[TraceSpan]):
-        """写入 SQLite"""
-        try:
-            from backend.core.database import async_session_maker
-            from sqlalchemy import text
-
-            async with async_session_maker() as session:
-                await session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS ai_traces (
-                        span_id TEXT PRIMARY KEY,
-                        trace_id TEXT,
-                        parent_id TEXT,
-                        trace_type TEXT,
-                        name TEXT,
-                        model_id TEXT,
-                        project_id TEXT,
-                        start_time REAL,
-                        end_time REAL,
-                        duration_ms REAL,
-                        prompt_tokens INTEGER,
-                        completion_tokens INTEGER,
-                        total_tokens INTEGER,
-                        estimated_cost_cents REAL,
-                        status TEXT,
-                        error_message TEXT,
-                        metadata TEXT
-                    )
-                """))
-                for span in spans:
-                    await session.execute(
-                        text("""INSERT OR REPLACE INTO ai_traces
-                                (span_id, trace_id, parent_id, trace_type, name,
-                                 model_id, project_id, start_time, end_time, duration_ms,
-                                 prompt_tokens, completion_tokens, total_tokens,
-                                 estimated_cost_cents, status, error_message, metadata)
-                                VALUES (:sid, :tid, :pid, :tt, :name,
-                                        :mid, :prid, :st, :et, :dur,
-                                        :pt, :ct, :totalt,
-                                        :cost, :status, :err, :meta)"""),
-                        {
-                            "sid": span.span_id,
-                            "tid": span.trace_id,
-                            "pid": span.parent_id,
-                            "tt": span.trace_type.value,
-                            "name": span.name,
-                            "mid": span.model_id,
-                            "prid": span.project_id,
-                            "st": span.start_time,
-                            "et": span.end_time,
-                            "dur": span.duration_ms,
-                            "pt": span.prompt_tokens,
-                            "ct": span.completion_tokens,
-                            "totalt": span.total_tokens,
-                            "cost": span.estimated_cost_cents,
-                            "status": span.status,
-                            "err": span.error_message,
-                            "meta": json.dumps(span.metadata),
-                        },
-                    )
-                await session.commit()
-        except Exception as e:
-            logger.warning("Trace 持久化异常: %s", e)
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        """打开写入线程专用的同步 SQLite 连接 (与主引擎一致的 WAL 配置, 首次建表/索引)
+
+        文件路径取自主引擎的 URL: 相对的 STUDIO_DATA_PATH 在 settings.data_path 中会被解析为
+        PROJECT_ROOT 下的路径, 与引擎实际打开的文件不同。
+        """
+        from backend.core.database import engine
+
+        conn = sqlite3.connect(engine.url.database, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not Tracer._schema_ready:
+            with conn:
+                conn.execute(_CREATE_TRACES_SQL)
+                conn.execute(_CREATE_TRACES_INDEX_SQL)
+            Tracer._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _persist_spans(conn: sqlite3.Connection, spans: List[TraceSpan]):
+        """写入 SQLite (单事务 executemany, 复用连接上已预编译的语句)"""
+        with conn:
+            conn.executemany(_INSERT_TRACE_SQL, [_span_row(span) for span in spans])
 
 
 # ── 全局单例 ──
@@ -6,13 +6,10 @@ Gemini, Claude 等模型。
 """
 from __future__ import annotations
 
-import json
 import logging
 import uuid
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
-import httpx
-
 from .base import (
     AuthenticationError,
     BaseProvider,
@@ -23,7 +20,13 @@ from .base import (
     ProviderEvent,
     ProviderInfo,
 )
-from .github_models import _parse_sse_chunk, _parse_completion_response, _parse_error_meta
+from .github_models import (
+    _iter_sse_events,
+    _json_dumps,
+    _json_loads,
+    _parse_completion_response,
+    _parse_error_meta,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -38,12 +41,6 @@ class AntigravityProvider(BaseProvider):
             ProviderCapability.TOOLS,
             ProviderCapability.VISION,
         }
-        self._client: Optional[httpx.AsyncClient] = None
-
-    def _get_client(self) -> httpx.AsyncClient:
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(timeout=300)
-        return self._client
 
     async def _get_headers(self, request_id: str = "") -> Dict[str, str]:
         """获取 Anti-Gravity API 请求头"""
@@ -94,12 +91,10 @@ class AntigravityProvider(BaseProvider):
 
         logger.info(f"Using Anti-Gravity API for model: {model}")
 
-        client = self._get_client()
-        async with client.stream(
-            "POST",
+        async with self._open_stream(
             self._build_url(),
             headers=headers,
-            json=payload,
+            content=_json_dumps(payload),
         ) as response:
             if response.status_code != 200:
                 error_body = await response.aread()
@@ -112,19 +107,8 @@ class AntigravityProvider(BaseProvider):
                 )
                 return
 
-            async for line in response.aiter_lines():
-                if not line.startswith("data: "):
-                    continue
-                data = line[6:]
-                if data.strip() == "[DONE]":
-                    break
-                try:
-                    chunk = json.loads(data)
-                except Exception:
-                    continue
-
-                for event in _parse_sse_chunk(chunk):
-                    yield event
+            async for event in _iter_sse_events(response):
+                yield event
 
     async def complete(
         self,
@@ -153,11 +137,10 @@ class AntigravityProvider(BaseProvider):
             payload["tools"] = tools
             payload["tool_choice"] = tool_choice
 
-        client = self._get_client()
-        response = await client.post(
+        response = await self._post(
             self._build_url(),
             headers=headers,
-            json=payload,
+            content=_json_dumps(payload),
         )
         if response.status_code != 200:
             error_text = response.text
@@ -169,9 +152,4 @@ class AntigravityProvider(BaseProvider):
                 error_meta=_parse_error_meta(response.status_code, error_text, model, "antigravity"),
             )
 
-        return _parse_completion_response(response.json())
-
-    async def close(self):
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
+        return _parse_completion_response(_json_loads(response.content))
@@ -6,19 +6,29 @@ Provider 仅负责协议差异 (认证、header、SSE 解析)，不含工具循
 """
 from __future__ import annotations
 
+import asyncio
 import enum
+import logging
+import random
 import time
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
 from typing import (
     Any,
     AsyncGenerator,
+    AsyncIterator,
     Dict,
     List,
     Literal,
     Optional,
     Set,
 )
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
 
 
 # ── 事件协议 ────────────────────────────────────────────────
@@ -33,7 +43,7 @@ class EventType(str, enum.Enum):
     ERROR = "error"
 
 
-@dataclass
+@dataclass(slots=True)
 class ProviderEvent:
     """Provider 流式输出的一个事件
 
@@ -44,6 +54,9 @@ class ProviderEvent:
       - usage:             usage (dict)
       - finish:            finish_reason (str)
       - error:             error (str), error_meta (dict)
+
+    流式热路径上每个 chunk 都会创建事件, 因此使用 slots 且 dict 字段默认 None
+    (不为每个 content_delta 分配空 dict), 仅对应类型的事件才会携带。
     """
     type: EventType
 
@@ -57,14 +70,14 @@ class ProviderEvent:
     arguments_delta: str = ""
 
     # usage
-    usage: Dict[str, Any] = field(default_factory=dict)
+    usage: Optional[Dict[str, Any]] = None
 
     # finish
     finish_reason: str = ""
 
     # error
     error: str = ""
-    error_meta: Dict[str, Any] = field(default_factory=dict)
+    error_meta: Optional[Dict[str, Any]] = None
 
 
 # ── 能力声明 ────────────────────────────────────────────────
@@ -136,6 +149,11 @@ class RateLimitError(ProviderError):
         self.retry_after = retry_after
 
 
+class ProviderBusyError(ProviderError):
+    """本地并发名额已满 (排队超过 llm_queue_timeout_seconds)"""
+    pass
+
+
 class ContextOverflowError(ProviderError):
     """上下文窗口溢出"""
     def __init__(self, message: str, max_tokens: int = 0, requested_tokens: int = 0, **kwargs):
@@ -144,6 +162,83 @@ class ContextOverflowError(ProviderError):
         self.requested_tokens = requested_tokens
 
 
+# ── 共享 HTTP 客户端 ─────────────────────────────────────
+
+# Provider 按上游 origin (host:port) 共用连接池: LLMClient 会周期性重建 Provider 实例,
+# 若每个实例各持有 AsyncClient, 每次重建都要重新握手且旧连接池无人关闭;
+# 按 origin 分池则各上游的连接数上限互不挤占 (OpenAI 与 DeepSeek 不抢同一个池)。
+_shared_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    """httpx 的 HTTP/2 支持依赖可选包 h2"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_shared_client(base_url: str = "") -> httpx.AsyncClient:
+    """获取 base_url 所在 origin 共用的 httpx.AsyncClient (惰性创建)
+
+    安装了 h2 时启用 HTTP/2: 同一 host 的并发流复用一条连接 (多路复用)。
+    """
+    origin = urlsplit(base_url).netloc.lower()
+    client = _shared_clients.get(origin)
+    if client is None or client.is_closed:
+        client = _shared_clients[origin] = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=httpx.Timeout(300, connect=10),
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=30,
+            ),
+        )
+    return client
+
+
+async def close_shared_clients():
+    """关闭所有共享客户端 (应用关闭时调用)"""
+    clients = list(_shared_clients.values())
+    _shared_clients.clear()
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
+
+
+# ── 并发限制 + 限流重试 ─────────────────────────────────
+
+# 按提供商 slug 共享的并发信号量 (Provider 实例会被周期性重建, 不能挂在实例上)
+_provider_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_provider_semaphore(slug: str) -> asyncio.Semaphore:
+    """获取提供商的并发信号量 (上限: settings.llm_max_concurrency)"""
+    sem = _provider_semaphores.get(slug)
+    if sem is None:
+        from backend.core.config import settings
+        sem = _provider_semaphores[slug] = asyncio.Semaphore(settings.llm_max_concurrency)
+    return sem
+
+
+def _rate_limit_delay(response: httpx.Response, error_text: str, attempt: int) -> float:
+    """计算 429 后的等待秒数: Retry-After 头 > 错误文本中的 wait N seconds > 指数退避"""
+    from .github_models import _parse_wait_seconds
+
+    delay = 0.0
+    retry_after = response.headers.get("retry-after", "")
+    if retry_after.replace(".", "", 1).isdigit():
+        delay = float(retry_after)
+    if not delay:
+        # 只取等待秒数, 不必解析完整的 error_meta (重试成功时它会被直接丢弃)
+        delay = float(_parse_wait_seconds(error_text) or 0)
+    if not delay:
+        delay = 1.0 * (2 ** attempt)
+    return delay + delay * random.random() * 0.2  # jitter
+
+
 # ── 基类 ─────────────────────────────────────────────────
 
 class BaseProvider(ABC):
@@ -177,6 +272,103 @@ class BaseProvider(ABC):
     def supports(self, cap: ProviderCapability) -> bool:
         return cap in self._capabilities
 
+    def _get_client(self) -> httpx.AsyncClient:
+        return get_shared_client(self.info.base_url)
+
+    @asynccontextmanager
+    async def _provider_slot(self) -> AsyncIterator[None]:
+        """占用提供商的一个并发名额; 排队超过 llm_queue_timeout_seconds 抛 ProviderBusyError (0 = 不限)"""
+        from backend.core.config import settings
+
+        sem = get_provider_semaphore(self.slug)
+        timeout = settings.llm_queue_timeout_seconds
+        try:
+            async with asyncio.timeout(timeout or None):
+                await sem.acquire()
+        except TimeoutError:
+            raise ProviderBusyError(
+                f"{self.name} 并发请求已满 ({settings.llm_max_concurrency} 个进行中), "
+                f"排队 {timeout:g}s 仍无空闲名额, 请稍后重试",
+                status_code=503,
+                error_meta={
+                    "status_code": 503,
+                    "provider_type": self.info.provider_type,
+                    "error_type": "rate_limit",
+                    "concurrency_limit": settings.llm_max_concurrency,
+                },
+            ) from None
+        try:
+            yield
+        finally:
+            sem.release()
+
+    async def _post(
+        self,
+        url: str,
+        *,
+        headers: Dict[str, str],
+        content: bytes,
+        retry_rate_limit: bool = True,
+    ) -> httpx.Response:
+        """非流式 POST: 受提供商并发上限约束, 429 时按服务端提示退避重试"""
+        from backend.core.config import settings
+
+        attempt = 0
+        while True:
+            async with self._provider_slot():
+                response = await self._get_client().post(url, headers=headers, content=content)
+            if (
+                response.status_code != 429
+                or not retry_rate_limit
+                or attempt >= settings.llm_rate_limit_retry_max
+            ):
+                return response
+            delay = _rate_limit_delay(response, response.text, attempt)
+            if delay > settings.llm_rate_limit_max_wait_seconds:
+                return response
+            attempt += 1
+            logger.warning(
+                "%s 命中限流(429), %.2fs 后重试 (%d/%d)",
+                self.name, delay, attempt, settings.llm_rate_limit_retry_max,
+            )
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def _open_stream(
+        self,
+        url: str,
+        *,
+        headers: Dict[str, str],
+        content: bytes,
+    ) -> AsyncIterator[httpx.Response]:
+        """流式 POST: 整个流期间占用一个并发名额; 首包即 429 时退避重试 (尚未产出任何事件)
+
+        名额排队超过 llm_queue_timeout_seconds 时抛 ProviderBusyError, 不无限等待。
+        """
+        from backend.core.config import settings
+
+        attempt = 0
+        async with self._provider_slot():
+            while True:
+                async with self._get_client().stream(
+                    "POST", url, headers=headers, content=content,
+                ) as response:
+                    delay = 0.0
+                    if response.status_code == 429 and attempt < settings.llm_rate_limit_retry_max:
+                        error_text = (await response.aread()).decode(errors="replace")
+                        delay = _rate_limit_delay(response, error_text, attempt)
+                        if delay > settings.llm_rate_limit_max_wait_seconds:
+                            delay = 0.0
+                    if not delay:
+                        yield response
+                        return
+                attempt += 1
+                logger.warning(
+                    "%s 命中限流(429), %.2fs 后重试 (%d/%d)",
+                    self.name, delay, attempt, settings.llm_rate_limit_retry_max,
+                )
+                await asyncio.sleep(delay)
+
     # ── 核心接口 ──
 
     @abstractmethod
@@ -223,7 +415,7 @@ class BaseProvider(ABC):
     # ── 生命周期 ──
 
     async def close(self):
-        """清理资源 (http client 等)"""
+        """清理资源 (http 连接池为共享的, 由 close_shared_clients 统一关闭)"""
         pass
 
     def __repr__(self):
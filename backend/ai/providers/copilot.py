@@ -7,15 +7,12 @@ Copilot Provider — api.githubcopilot.com
 from __future__ import annotations
 
 import hashlib
-import json
 import logging
 import platform
 import time
 import uuid
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
-import httpx
-
 from .base import (
     AuthenticationError,
     BaseProvider,
@@ -26,7 +23,13 @@ from .base import (
     ProviderEvent,
     ProviderInfo,
 )
-from .github_models import _parse_sse_chunk, _parse_completion_response, _parse_error_meta
+from .github_models import (
+    _iter_sse_events,
+    _json_dumps,
+    _json_loads,
+    _parse_completion_response,
+    _parse_error_meta,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -47,12 +50,6 @@ class CopilotProvider(BaseProvider):
             ProviderCapability.TOOLS,
             ProviderCapability.VISION,
         }
-        self._client: Optional[httpx.AsyncClient] = None
-
-    def _get_client(self) -> httpx.AsyncClient:
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(timeout=300)
-        return self._client
 
     async def _get_headers(self, request_id: str = "") -> Dict[str, str]:
         """获取 Copilot API 请求头 (含计费归集头)"""
@@ -110,12 +107,10 @@ class CopilotProvider(BaseProvider):
         log_rid = f" (request_id: {request_id[:8]}...)" if request_id else ""
         logger.info(f"Using Copilot API for model: {model}{log_rid}")
 
-        client = self._get_client()
-        async with client.stream(
-            "POST",
+        async with self._open_stream(
             self._build_url(),
             headers=headers,
-            json=payload,
+            content=_json_dumps(payload),
         ) as response:
             if response.status_code != 200:
                 error_body = await response.aread()
@@ -128,19 +123,8 @@ class CopilotProvider(BaseProvider):
                 )
                 return
 
-            async for line in response.aiter_lines():
-                if not line.startswith("data: "):
-                    continue
-                data = line[6:]
-                if data.strip() == "[DONE]":
-                    break
-                try:
-                    chunk = json.loads(data)
-                except Exception:
-                    continue
-
-                for event in _parse_sse_chunk(chunk):
-                    yield event
+            async for event in _iter_sse_events(response):
+                yield event
 
     async def complete(
         self,
@@ -169,11 +153,10 @@ class CopilotProvider(BaseProvider):
             payload["tools"] = tools
             payload["tool_choice"] = tool_choice
 
-        client = self._get_client()
-        response = await client.post(
+        response = await self._post(
             self._build_url(),
             headers=headers,
-            json=payload,
+            content=_json_dumps(payload),
         )
         if response.status_code != 200:
             error_text = response.text
@@ -185,9 +168,4 @@ class CopilotProvider(BaseProvider):
                 error_meta=_parse_error_meta(response.status_code, error_text, model, "copilot"),
             )
 
-        return _parse_completion_response(response.json())
-
-    async def close(self):
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
+        return _parse_completion_response(_json_loads(response.content))
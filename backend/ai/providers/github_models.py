@@ -8,6 +8,7 @@ from __future__ import annotations
 
 import json
 import logging
+import re
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
 import httpx
@@ -25,6 +26,30 @@ from .base import (
 
 logger = logging.getLogger(__name__)
 
+# orjson (可选依赖): SSE 逐 chunk 解析是 Provider 层的主要 CPU 开销, 有则优先使用
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+except ImportError:  # pragma: no cover - 回退标准库
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+# _parse_error_meta 用到的错误文本模式 (模块加载时编译一次)
+_RE_RATE_LIMIT_OF = re.compile(r'Rate limit of (\d+) per (\d+)s', re.I)
+_RE_RATE_PER_UNIT = re.compile(r'(\d+) per (\d+) (second|minute|hour)', re.I)
+_RE_WAIT_SECONDS = re.compile(r'wait\s+(\d+)\s*seconds?', re.I)
+_RE_MAX_CONTEXT = re.compile(r'maximum context length.*?(\d{3,})', re.I)
+_RE_MAX_SIZE = re.compile(r'Max size:\s*(\d+)\s*tokens', re.I)
+_RE_REQUESTED_TOKENS = re.compile(r'requested\s+(\d+)\s*tokens', re.I)
+
 
 class GitHubModelsProvider(BaseProvider):
     """GitHub Models API 提供商"""
@@ -37,12 +62,6 @@ class GitHubModelsProvider(BaseProvider):
             ProviderCapability.VISION,
             ProviderCapability.EMBEDDINGS,
         }
-        self._client: Optional[httpx.AsyncClient] = None
-
-    def _get_client(self) -> httpx.AsyncClient:
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(timeout=300)
-        return self._client
 
     def _headers(self) -> Dict[str, str]:
         return {
@@ -76,12 +95,10 @@ class GitHubModelsProvider(BaseProvider):
             payload["tools"] = tools
             payload["tool_choice"] = tool_choice
 
-        client = self._get_client()
-        async with client.stream(
-            "POST",
+        async with self._open_stream(
             self._build_url(),
             headers=self._headers(),
-            json=payload,
+            content=_json_dumps(payload),
         ) as response:
             if response.status_code != 200:
                 error_body = await response.aread()
@@ -94,19 +111,8 @@ class GitHubModelsProvider(BaseProvider):
                 )
                 return
 
-            async for line in response.aiter_lines():
-                if not line.startswith("data: "):
-                    continue
-                data = line[6:]
-                if data.strip() == "[DONE]":
-                    break
-                try:
-                    chunk = json.loads(data)
-                except Exception:
-                    continue
-
-                for event in _parse_sse_chunk(chunk):
-                    yield event
+            async for event in _iter_sse_events(response):
+                yield event
 
     async def complete(
         self,
@@ -130,11 +136,10 @@ class GitHubModelsProvider(BaseProvider):
             payload["tools"] = tools
             payload["tool_choice"] = tool_choice
 
-        client = self._get_client()
-        response = await client.post(
+        response = await self._post(
             self._build_url(),
             headers=self._headers(),
-            json=payload,
+            content=_json_dumps(payload),
         )
         if response.status_code != 200:
             error_text = response.text
@@ -145,7 +150,7 @@ class GitHubModelsProvider(BaseProvider):
                 error_meta=_parse_error_meta(response.status_code, error_text, model, "github_models"),
             )
 
-        return _parse_completion_response(response.json())
+        return _parse_completion_response(_json_loads(response.content))
 
     async def embed(
         self,
@@ -157,67 +162,145 @@ class GitHubModelsProvider(BaseProvider):
             "model": model,
             "input": texts,
         }
-        client = self._get_client()
-        response = await client.post(
+        response = await self._post(
             self._build_url("/embeddings"),
             headers=self._headers(),
-            json=payload,
+            content=_json_dumps(payload),
+            retry_rate_limit=False,
         )
         if response.status_code != 200:
             raise ProviderError(
                 f"Embedding 错误 ({response.status_code}): {response.text}",
                 status_code=response.status_code,
             )
-        result = response.json()
+        result = _json_loads(response.content)
         embeddings = [item["embedding"] for item in result.get("data", [])]
         usage = result.get("usage", {})
         return EmbeddingResult(embeddings=embeddings, model=model, usage=usage)
 
-    async def close(self):
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
-
 
 # ── 共享工具函数 (其他 Provider 也复用) ──────────────────
 
 
+async def _iter_sse_frames(response: httpx.Response) -> AsyncGenerator[List[bytes], None]:
+    """逐块读取 SSE 响应体, 每次网络读取 yield 其中完整的 ``data:`` 负载列表 (bytes)
+
+    直接在字节缓冲上用 bytes.find 切行, 省去 aiter_lines 的逐行解码与拆分;
+    以 ":" 开头的注释行 (心跳) 及其他字段行按 SSE 规范忽略。遇到 [DONE] 结束。
+    """
+    buf = bytearray()
+    async for raw in response.aiter_bytes():
+        buf += raw
+        frames: List[bytes] = []
+        start = 0
+        while True:
+            nl = buf.find(b"\n", start)
+            if nl == -1:
+                break
+            line = buf[start:nl]
+            start = nl + 1
+            if not line.startswith(b"data:"):
+                continue
+            data = bytes(line[5:]).strip()
+            if data == b"[DONE]":
+                if frames:
+                    yield frames
+                return
+            if data:
+                frames.append(data)
+        if start:
+            del buf[:start]
+        if frames:
+            yield frames
+
+    # 末尾没有换行的残留帧
+    if buf.startswith(b"data:"):
+        data = bytes(buf[5:]).strip()
+        if data and data != b"[DONE]":
+            yield [data]
+
+
+# 可合并的增量事件类型
+_COALESCE_TYPES = frozenset({EventType.CONTENT_DELTA, EventType.THINKING_DELTA})
+
+
+async def _iter_sse_events(response: httpx.Response) -> AsyncGenerator[ProviderEvent, None]:
+    """SSE 响应 → ProviderEvent 流
+
+    同一次网络读取中相邻的同类文本增量 (content / thinking) 合并为一个事件,
+    减少下游逐 token 的事件分发; 其他事件保持原有顺序。
+    """
+    loads = _json_loads
+    parse_chunk = _parse_sse_chunk
+    async for frames in _iter_sse_frames(response):
+        pending: Optional[ProviderEvent] = None
+        parts: List[str] = []
+        for data in frames:
+            try:
+                chunk = loads(data)
+            except Exception:
+                continue
+            for event in parse_chunk(chunk):
+                if pending is not None:
+                    if event.type is pending.type and event.type in _COALESCE_TYPES:
+                        parts.append(event.text)
+                        continue
+                    if len(parts) > 1:
+                        pending.text = "".join(parts)
+                    yield pending
+                pending = event
+                parts = [event.text]
+        if pending is not None:
+            if len(parts) > 1:
+                pending.text = "".join(parts)
+            yield pending
+
+
+_EMPTY: Dict[str, Any] = {}  # 只读占位, 避免为缺失的 choice/delta/function 分配空 dict
+
+
 def _parse_sse_chunk(chunk: Dict[str, Any]) -> List[ProviderEvent]:
     """解析一个 SSE chunk → 零或多个 ProviderEvent"""
+    choices = chunk.get("choices")
+    choice = choices[0] if choices else _EMPTY
+    delta = choice.get("delta") or _EMPTY
+    fr = choice.get("finish_reason")
+    thinking = delta.get("reasoning_content") or delta.get("thinking")
+    content = delta.get("content")
+    tool_calls = delta.get("tool_calls")
+    usage = chunk.get("usage")
+
+    # 绝大多数 chunk 只是一段正文增量: 直接返回
+    if not (fr or thinking or tool_calls or usage):
+        return [ProviderEvent(type=EventType.CONTENT_DELTA, text=content)] if content else []
+
     events: List[ProviderEvent] = []
-    choice = chunk.get("choices", [{}])[0] if chunk.get("choices") else {}
-    delta = choice.get("delta", {})
 
     # finish_reason
-    fr = choice.get("finish_reason")
     if fr:
         events.append(ProviderEvent(type=EventType.FINISH, finish_reason=fr))
 
     # thinking (reasoning models)
-    thinking = delta.get("reasoning_content") or delta.get("thinking") or ""
     if thinking:
         events.append(ProviderEvent(type=EventType.THINKING_DELTA, text=thinking))
 
     # content
-    content = delta.get("content")
     if content:
         events.append(ProviderEvent(type=EventType.CONTENT_DELTA, text=content))
 
     # tool_calls
-    if "tool_calls" in delta:
-        for tc in delta["tool_calls"]:
-            idx = tc.get("index", 0)
-            func = tc.get("function", {})
+    if tool_calls:
+        for tc in tool_calls:
+            func = tc.get("function") or _EMPTY
             events.append(ProviderEvent(
                 type=EventType.TOOL_CALL_DELTA,
-                tool_call_index=idx,
+                tool_call_index=tc.get("index", 0),
                 tool_call_id=tc.get("id", ""),
                 name=func.get("name", ""),
                 arguments_delta=func.get("arguments", ""),
             ))
 
     # usage (有些 provider 在流中返回 usage)
-    usage = chunk.get("usage")
     if usage:
         events.append(ProviderEvent(type=EventType.USAGE, usage=usage))
 
@@ -234,8 +317,8 @@ def _parse_completion_response(result: Dict[str, Any]) -> CompletionResult:
         for tc in message["tool_calls"]:
             func = tc.get("function", {})
             try:
-                args = json.loads(func.get("arguments", "{}"))
-            except json.JSONDecodeError:
+                args = _json_loads(func.get("arguments", "{}"))
+            except ValueError:
                 args = {"_raw": func.get("arguments", "")}
             tool_calls.append({
                 "id": tc.get("id", ""),
@@ -253,6 +336,12 @@ def _parse_completion_response(result: Dict[str, Any]) -> CompletionResult:
     )
 
 
+def _parse_wait_seconds(error_text: str) -> Optional[int]:
+    """提取限流错误中的 "wait N seconds" (无则 None)"""
+    m = _RE_WAIT_SECONDS.search(error_text)
+    return int(m.group(1)) if m else None
+
+
 def _parse_error_meta(
     status_code: int,
     error_text: str,
@@ -260,7 +349,6 @@ def _parse_error_meta(
     provider_type: str = "",
 ) -> Dict[str, Any]:
     """从 API 错误响应中提取结构化元数据"""
-    import re
     meta: Dict[str, Any] = {"status_code": status_code, "model": model}
     if provider_type:
         meta["provider_type"] = provider_type
@@ -269,30 +357,30 @@ def _parse_error_meta(
 
     if status_code == 429 or "rate limit" in lower:
         meta["error_type"] = "rate_limit"
-        m = re.search(r'Rate limit of (\d+) per (\d+)s', error_text, re.I)
+        m = _RE_RATE_LIMIT_OF.search(error_text)
         if m:
             meta["rate_limit"] = f"{m.group(1)} per {m.group(2)}s"
             meta["rate_limit_count"] = int(m.group(1))
             meta["rate_limit_seconds"] = int(m.group(2))
-        m = re.search(r'(\d+) per (\d+) (second|minute|hour)', error_text, re.I)
+        m = _RE_RATE_PER_UNIT.search(error_text)
         if m and "rate_limit" not in meta:
             unit_map = {"second": 1, "minute": 60, "hour": 3600}
             secs = int(m.group(2)) * unit_map.get(m.group(3).lower(), 1)
             meta["rate_limit"] = f"{m.group(1)} per {secs}s"
             meta["rate_limit_count"] = int(m.group(1))
             meta["rate_limit_seconds"] = secs
-        m = re.search(r'wait\s+(\d+)\s*seconds?', error_text, re.I)
-        if m:
-            meta["wait_seconds"] = int(m.group(1))
+        wait = _parse_wait_seconds(error_text)
+        if wait is not None:
+            meta["wait_seconds"] = wait
     elif "context length" in lower or "too large" in lower or "max_tokens" in lower:
         meta["error_type"] = "context_overflow"
-        m = re.search(r'maximum context length.*?(\d{3,})', error_text, re.I)
+        m = _RE_MAX_CONTEXT.search(error_text)
         if m:
             meta["max_context_tokens"] = int(m.group(1))
-        m = re.search(r'Max size:\s*(\d+)\s*tokens', error_text, re.I)
+        m = _RE_MAX_SIZE.search(error_text)
         if m:
             meta["max_context_tokens"] = int(m.group(1))
-        m = re.search(r'requested\s+(\d+)\s*tokens', error_text, re.I)
+        m = _RE_REQUESTED_TOKENS.search(error_text)
         if m:
             meta["requested_tokens"] = int(m.group(1))
     elif status_code in (401, 403):
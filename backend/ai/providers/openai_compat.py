@@ -9,12 +9,9 @@ OpenAI Compatible Provider — 通用第三方 API
 """
 from __future__ import annotations
 
-import json
 import logging
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
-import httpx
-
 from .base import (
     BaseProvider,
     CompletionResult,
@@ -25,7 +22,13 @@ from .base import (
     ProviderEvent,
     ProviderInfo,
 )
-from .github_models import _parse_sse_chunk, _parse_completion_response, _parse_error_meta
+from .github_models import (
+    _iter_sse_events,
+    _json_dumps,
+    _json_loads,
+    _parse_completion_response,
+    _parse_error_meta,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -40,12 +43,6 @@ class OpenAICompatProvider(BaseProvider):
             ProviderCapability.TOOLS,
             ProviderCapability.VISION,
         }
-        self._client: Optional[httpx.AsyncClient] = None
-
-    def _get_client(self) -> httpx.AsyncClient:
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(timeout=300)
-        return self._client
 
     def _headers(self) -> Dict[str, str]:
         h = {"Content-Type": "application/json"}
@@ -82,12 +79,10 @@ class OpenAICompatProvider(BaseProvider):
 
         logger.info(f"Using {self.info.name} ({self.info.slug}) for model: {model}")
 
-        client = self._get_client()
-        async with client.stream(
-            "POST",
+        async with self._open_stream(
             self._build_url(),
             headers=self._headers(),
-            json=payload,
+            content=_json_dumps(payload),
         ) as response:
             if response.status_code != 200:
                 error_body = await response.aread()
@@ -100,19 +95,8 @@ class OpenAICompatProvider(BaseProvider):
                 )
                 return
 
-            async for line in response.aiter_lines():
-                if not line.startswith("data: "):
-                    continue
-                data = line[6:]
-                if data.strip() == "[DONE]":
-                    break
-                try:
-                    chunk = json.loads(data)
-                except Exception:
-                    continue
-
-                for event in _parse_sse_chunk(chunk):
-                    yield event
+            async for event in _iter_sse_events(response):
+                yield event
 
     async def complete(
         self,
@@ -136,11 +120,10 @@ class OpenAICompatProvider(BaseProvider):
             payload["tools"] = tools
             payload["tool_choice"] = tool_choice
 
-        client = self._get_client()
-        response = await client.post(
+        response = await self._post(
             self._build_url(),
             headers=self._headers(),
-            json=payload,
+            content=_json_dumps(payload),
         )
         if response.status_code != 200:
             error_text = response.text
@@ -151,7 +134,7 @@ class OpenAICompatProvider(BaseProvider):
                 error_meta=_parse_error_meta(response.status_code, error_text, model, "openai_compatible"),
             )
 
-        return _parse_completion_response(response.json())
+        return _parse_completion_response(_json_loads(response.content))
 
     async def embed(
         self,
@@ -164,22 +147,17 @@ class OpenAICompatProvider(BaseProvider):
             raise ProviderError(f"{self.info.name}: 需要指定 embedding 模型名")
 
         payload = {"model": model, "input": texts}
-        client = self._get_client()
-        response = await client.post(
+        response = await self._post(
             self._build_url("/embeddings"),
             headers=self._headers(),
-            json=payload,
+            content=_json_dumps(payload),
+            retry_rate_limit=False,
         )
         if response.status_code != 200:
             raise ProviderError(
                 f"{self.info.name} Embedding 错误 ({response.status_code}): {response.text}",
                 status_code=response.status_code,
             )
-        result = response.json()
+        result = _json_loads(response.content)
         embeddings = [item["embedding"] for item in result.get("data", [])]
         return EmbeddingResult(embeddings=embeddings, model=model, usage=result.get("usage", {}))
-
-    async def close(self):
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
@@ -7,14 +7,35 @@ RAG — 文档分块器
 """
 from __future__ import annotations
 
+import bisect
 import re
 from dataclasses import dataclass
-from typing import List, Optional
-
-
-@dataclass
+from typing import Dict, List, Optional
+
+# 函数/类边界模式 (按扩展名索引, 模块加载时编译一次)
+# MULTILINE 整篇扫描, 语义等价于逐行 pattern.match(line.strip()):
+#   - 行首缩进用占有量词吞掉, 不回溯 (否则 ".*" 之类可能从缩进里开始匹配)
+#   - 以空格结尾的前缀要求同一行后面还有非空白字符 (原先行尾空白会被 strip 掉)
+_INDENT = r'^[^\S\n]*+'
+_REST = r'(?=.*\S)'
+_PY_BOUNDARY = re.compile(_INDENT + r'(class |def |async def )\w', re.M)
+_JS_BOUNDARY = re.compile(_INDENT + r'(export |)(function |class |const \w+ = |interface |type )' + _REST, re.M)
+_GO_BOUNDARY = re.compile(_INDENT + r'(func |type )\w', re.M)
+_JVM_BOUNDARY = re.compile(
+    _INDENT + r'(public |private |protected |)(static |)((class |interface |void )' + _REST + r'|.* \w+\()', re.M,
+)
+
+_BOUNDARY_PATTERNS: Dict[str, re.Pattern] = {
+    "py": _PY_BOUNDARY,
+    "js": _JS_BOUNDARY, "ts": _JS_BOUNDARY, "jsx": _JS_BOUNDARY, "tsx": _JS_BOUNDARY, "vue": _JS_BOUNDARY,
+    "go": _GO_BOUNDARY,
+    "java": _JVM_BOUNDARY, "kt": _JVM_BOUNDARY, "scala": _JVM_BOUNDARY,
+}
+
+
+@dataclass(slots=True)
 class Chunk:
-    """文档块"""
+    """文档块 (slots: 大型工作区会产生数万个实例, 省去每个实例的 __dict__)"""
     content: str
     source: str  # 文件路径
     start_line: int = 0
@@ -41,56 +62,52 @@ class CodeChunker:
         self.max_chunk_chars = max_chunk_tokens * 4
 
     def chunk_file(self, content: str, source: str) -> List[Chunk]:
-        """将代码文件分块"""
-        lines = content.split("\n")
-        if not lines:
-            return []
+        """将代码文件分块
+
+        不再把整个文件拆成行列表: 只记录每行起始偏移, 产出块时才切片一次。
+        """
+        offsets = _line_offsets(content)
 
         # 尝试按函数/类边界分割
-        boundaries = self._detect_boundaries(lines, source)
+        boundaries = self._detect_boundaries(content, offsets, source)
         if boundaries:
-            return self._split_by_boundaries(lines, boundaries, source)
+            return self._split_by_boundaries(content, offsets, boundaries, source)
 
         # 回退: 按固定行数分割
-        return self._split_by_lines(lines, source)
+        return self._split_by_lines(content, offsets, source)
 
-    def _detect_boundaries(self, lines: List[str], source: str) -> List[int]:
+    def _detect_boundaries(self, content: str, offsets: List[int], source: str) -> List[int]:
         """检测函数/类定义的行号"""
         boundaries = [0]
         ext = source.rsplit(".", 1)[-1].lower() if "." in source else ""
 
-        if ext in ("py",):
-            pattern = re.compile(r'^(class |def |async def )\w')
-        elif ext in ("js", "ts", "jsx", "tsx", "vue"):
-            pattern = re.compile(r'^(export |)(function |class |const \w+ = |interface |type )')
-        elif ext in ("go",):
-            pattern = re.compile(r'^(func |type )\w')
-        elif ext in ("java", "kt", "scala"):
-            pattern = re.compile(r'^\s*(public |private |protected |)(static |)(class |interface |void |.* \w+\()')
-        else:
+        pattern = _BOUNDARY_PATTERNS.get(ext)
+        if pattern is None:
             return []
 
-        for i, line in enumerate(lines):
-            if pattern.match(line.strip()) and i > 0:
-                boundaries.append(i)
+        # 一次 finditer 扫完整个文件, 命中位置恰为行首, 二分映射回行号
+        for m in pattern.finditer(content, 1):
+            boundaries.append(bisect.bisect_right(offsets, m.start()) - 1)
 
         return boundaries if len(boundaries) > 1 else []
 
-    def _split_by_boundaries(self, lines: List[str], boundaries: List[int], source: str) -> List[Chunk]:
+    def _split_by_boundaries(
+        self, content: str, offsets: List[int], boundaries: List[int], source: str,
+    ) -> List[Chunk]:
         """按边界分割"""
         chunks = []
+        num_lines = len(offsets)
         for i in range(len(boundaries)):
             start = boundaries[i]
-            end = boundaries[i + 1] if i + 1 < len(boundaries) else len(lines)
-            content = "\n".join(lines[start:end])
+            end = boundaries[i + 1] if i + 1 < len(boundaries) else num_lines
 
-            # 如果块太大，进一步分割
-            if len(content) > self.max_chunk_chars:
-                sub_chunks = self._split_by_lines(lines[start:end], source, base_line=start)
-                chunks.extend(sub_chunks)
+            # 如果块太大，进一步分割 (长度由偏移算出, 不先拼接内容)
+            size = (offsets[end] - 1 if end < num_lines else len(content)) - offsets[start]
+            if size > self.max_chunk_chars:
+                chunks.extend(self._split_by_lines(content, offsets, source, start, end))
             else:
                 chunks.append(Chunk(
-                    content=content,
+                    content=_line_slice(content, offsets, start, end),
                     source=source,
                     start_line=start + 1,
                     end_line=end,
@@ -98,25 +115,46 @@ class CodeChunker:
                 ))
         return chunks
 
-    def _split_by_lines(self, lines: List[str], source: str, base_line: int = 0) -> List[Chunk]:
-        """按固定行数分割"""
+    def _split_by_lines(
+        self, content: str, offsets: List[int], source: str,
+        start: int = 0, stop: Optional[int] = None,
+    ) -> List[Chunk]:
+        """按固定行数分割 [start, stop) 行"""
         chunks = []
+        if stop is None:
+            stop = len(offsets)
         max_lines = max(10, self.max_chunk_chars // 80)  # 估算行数
-        i = 0
-        while i < len(lines):
-            end = min(i + max_lines, len(lines))
-            content = "\n".join(lines[i:end])
+        i = start
+        while i < stop:
+            end = min(i + max_lines, stop)
             chunks.append(Chunk(
-                content=content,
+                content=_line_slice(content, offsets, i, end),
                 source=source,
-                start_line=base_line + i + 1,
-                end_line=base_line + end,
+                start_line=i + 1,
+                end_line=end,
                 chunk_type="text",
             ))
-            i = end - self.overlap_lines if end < len(lines) else end
+            i = end - self.overlap_lines if end < stop else end
         return chunks
 
 
+def _line_offsets(content: str) -> List[int]:
+    """每行起始字符偏移 (长度 = 行数, 与 content.split("\n") 一一对应)"""
+    offsets = [0]
+    find = content.find
+    pos = find("\n")
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = find("\n", pos + 1)
+    return offsets
+
+
+def _line_slice(content: str, offsets: List[int], start: int, end: int) -> str:
+    """第 [start, end) 行的文本, 等价于 "\n".join(lines[start:end])"""
+    stop = offsets[end] - 1 if end < len(offsets) else len(content)
+    return content[offsets[start]:stop]
+
+
 class TextChunker:
     """通用文本分块器 — 按段落/句子分割"""
 
@@ -132,17 +170,24 @@ class TextChunker:
         # 按段落分割
         paragraphs = content.split("\n\n")
         chunks = []
-        current = ""
+        # 段落先收集到列表, 满块时一次 join (避免 += 反复拷贝整个缓冲区)
+        parts: List[str] = []
+        cur_len = 0  # == len("\n\n".join(parts))
 
         for para in paragraphs:
-            if len(current) + len(para) > self.max_chunk_chars:
-                if current:
-                    chunks.append(Chunk(content=current.strip(), source=source, chunk_type="text"))
-                current = para
+            if cur_len + len(para) > self.max_chunk_chars:
+                if cur_len:
+                    chunks.append(Chunk(content="\n\n".join(parts).strip(), source=source, chunk_type="text"))
+                parts = [para]
+                cur_len = len(para)
+            elif cur_len:
+                parts.append(para)
+                cur_len += 2 + len(para)
             else:
-                current += "\n\n" + para if current else para
+                parts = [para]
+                cur_len = len(para)
 
-        if current:
-            chunks.append(Chunk(content=current.strip(), source=source, chunk_type="text"))
+        if cur_len:
+            chunks.append(Chunk(content="\n\n".join(parts).strip(), source=source, chunk_type="text"))
 
         return chunks
@@ -8,13 +8,14 @@ EmbeddingService:
 from __future__ import annotations
 
 import asyncio
+import functools
 import hashlib
 import logging
 import math
 import random
 import re
 from collections import Counter
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from backend.ai.providers.base import ProviderError
 
@@ -22,6 +23,7 @@ logger = logging.getLogger(__name__)
 
 # embedding 维度 (TF-IDF fallback)
 TFIDF_DIM = 256
+_DIM_FROM_TAIL = (1 << 32) % TFIDF_DIM == 0
 
 
 class EmbeddingService:
@@ -30,6 +32,10 @@ class EmbeddingService:
     # 熔断冷却时间 (秒) — 被限流后多久才重新尝试 Provider
     CIRCUIT_BREAKER_COOLDOWN = 300  # 5 分钟
 
+    # embed_single 合并窗口: 窗口内的并发单条请求合并为一次 Provider 调用
+    COALESCE_WINDOW_SECONDS = 0.005
+    COALESCE_MAX_BATCH = 64
+
     def __init__(
         self,
         model: str = "text-embedding-3-small",
@@ -46,6 +52,9 @@ class EmbeddingService:
         # 熔断器状态
         self._circuit_open_until: float = 0.0  # Unix timestamp, >0 表示熔断中
         self._consecutive_429s: int = 0
+        # embed_single 合并队列
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
 
     def reset_circuit_breaker(self):
         """手动重置熔断器 (例如在新的索引周期开始时)"""
@@ -116,29 +125,88 @@ class EmbeddingService:
         return [self._tfidf_embed(text) for text in texts]
 
     async def embed_single(self, text: str) -> List[float]:
-        """单文本嵌入"""
-        results = await self.embed([text])
-        return results[0] if results else [0.0] * TFIDF_DIM
+        """单文本嵌入
+
+        并发调用会在 COALESCE_WINDOW_SECONDS 内合并为一次批量 embed,
+        减少 Provider 往返次数与限流压力。
+        """
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((text, fut))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_pending())
+        return await fut
+
+    async def _flush_pending(self):
+        """等待合并窗口结束后, 按 COALESCE_MAX_BATCH 分批处理排队的单条请求"""
+        try:
+            await asyncio.sleep(self.COALESCE_WINDOW_SECONDS)
+            while self._pending:
+                batch = self._pending[:self.COALESCE_MAX_BATCH]
+                del self._pending[:len(batch)]
+                try:
+                    results = await self.embed([text for text, _ in batch])
+                except Exception as e:
+                    for _, fut in batch:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+                for i, (_, fut) in enumerate(batch):
+                    if not fut.done():
+                        fut.set_result(results[i] if i < len(results) else [0.0] * TFIDF_DIM)
+        finally:
+            self._flush_task = None
 
     # 别名: retriever / indexer 统一调用 embed_text
     async def embed_text(self, text: str) -> List[float]:
         return await self.embed_single(text)
 
     def _tfidf_embed(self, text: str) -> List[float]:
-        """简易 TF-IDF 向量化"""
-        tokens = _tokenize(text)
-        if not tokens:
+        """简易 TF-IDF 向量化 (输出已 L2 归一化)"""
+        tf = Counter(_tokenize(text))
+        if not tf:
             return [0.0] * TFIDF_DIM
+        return _tf_vector(tf)
+
+
+@functools.lru_cache(maxsize=65536)
+def _token_dim(token: str) -> int:
+    """Hash token to dimension (按 token 缓存: 语料中高频词会被反复哈希)
+
+    直接对 md5 原始摘要取模, 省去 hexdigest 字符串与 int(..., 16) 解析;
+    结果与旧的 hex 写法完全一致。哈希算法保持 md5 不变: TF-IDF 向量会持久化
+    (rag_index / 记忆 embedding), 换算法会让已存向量与新向量落在不同维度。
+    """
+    digest = hashlib.md5(token.encode(), usedforsecurity=False).digest()
+    if _DIM_FROM_TAIL:
+        # 维度整除 2^32 时, 整个摘要 (大端) 取模只取决于末 4 字节
+        return int.from_bytes(digest[-4:], "big") % TFIDF_DIM
+    return int.from_bytes(digest, "big") % TFIDF_DIM
+
+
+# ── TF 向量 (numpy 可选) ─────────────────────────
+try:
+    import numpy as np
+
+    def _tf_vector(tf: Counter) -> List[float]:
+        """词频 → L2 归一化哈希向量 (numpy 加速: bincount 散列累加)"""
+        n = len(tf)
+        idx = np.fromiter((_token_dim(t) for t in tf), dtype=np.intp, count=n)
+        counts = np.fromiter(tf.values(), dtype=np.float64, count=n)
+        weights = 0.5 + 0.5 * counts / counts.max()  # normalized TF
+        vec = np.bincount(idx, weights=weights, minlength=TFIDF_DIM)
+        norm = math.sqrt(float(vec @ vec))
+        if norm > 0:
+            vec /= norm
+        return vec.tolist()
 
-        tf = Counter(tokens)
-        max_tf = max(tf.values()) if tf else 1
+except ImportError:
 
+    def _tf_vector(tf: Counter) -> List[float]:
+        """词频 → L2 归一化哈希向量 (纯 Python)"""
+        max_tf = max(tf.values())
         vec = [0.0] * TFIDF_DIM
         for token, count in tf.items():
-            # Hash token to dimension
-            idx = int(hashlib.md5(token.encode()).hexdigest(), 16) % TFIDF_DIM
-            weight = (0.5 + 0.5 * count / max_tf)  # normalized TF
-            vec[idx] += weight
+            vec[_token_dim(token)] += 0.5 + 0.5 * count / max_tf  # normalized TF
 
         # L2 normalize
         norm = math.sqrt(sum(v * v for v in vec))
@@ -147,17 +215,30 @@ class EmbeddingService:
         return vec
 
 
+def quantize_int8(vec: List[float]) -> List[int]:
+    """向量 → int8 整数列表 (按最大绝对值缩放到 ±127), 用于持久化
+
+    余弦相似度与缩放无关, 量化后的向量可直接与 float 查询向量比较,
+    不必存 scale; 稠密向量的 JSON 文本约缩小到 1/4。
+    """
+    peak = max(map(abs, vec), default=0.0)
+    if peak == 0:
+        return [0] * len(vec)
+    scale = 127.0 / peak
+    return [round(v * scale) for v in vec]
+
+
+# 英文单词 | 中文单字, 作用于 lower() 后的文本 (lower 不影响 CJK 字符)
+_TOKEN_RE = re.compile(r'[a-z_][a-z0-9_]*|[\u4e00-\u9fff]')
+
+
 def _tokenize(text: str) -> List[str]:
-    """简单分词 (英文 + 中文字符级)"""
-    # 英文单词
-    words = re.findall(r'[a-zA-Z_][a-zA-Z0-9_]*', text.lower())
-    # 中文字符
-    chars = re.findall(r'[\u4e00-\u9fff]', text)
-    return words + chars
+    """简单分词 (英文 + 中文字符级), 单次正则扫描"""
+    return _TOKEN_RE.findall(text.lower())
 
 
-def cosine_similarity(a: List[float], b: List[float]) -> float:
-    """余弦相似度"""
+def _cosine_py(a: List[float], b: List[float]) -> float:
+    """余弦相似度 (纯 Python)"""
     dot = sum(x * y for x, y in zip(a, b))
     norm_a = math.sqrt(sum(x * x for x in a))
     norm_b = math.sqrt(sum(x * x for x in b))
@@ -166,6 +247,53 @@ def cosine_similarity(a: List[float], b: List[float]) -> float:
     return dot / (norm_a * norm_b)
 
 
+# ── 余弦相似度 (numpy 可选) ──────────────────────
+try:
+    import numpy as np
+
+    def cosine_similarity(a: List[float], b: List[float]) -> float:
+        """余弦相似度"""
+        if len(a) != len(b) or not a:
+            return _cosine_py(a, b)  # 维度不一致 (不同 embedding 模型) 保持旧语义
+        va = np.asarray(a, dtype=np.float64)
+        vb = np.asarray(b, dtype=np.float64)
+        norm = math.sqrt(float(va @ va) * float(vb @ vb))
+        if norm == 0:
+            return 0.0
+        return float(va @ vb) / norm
+
+    def cosine_batch(query: List[float], vectors: List[Optional[List[float]]]) -> List[float]:
+        """query 与多条向量的余弦相似度 (同维度的行合并为一次矩阵乘)
+
+        空向量得 0.0; 维度与 query 不一致的行逐条回退到 cosine_similarity。
+        """
+        scores = [0.0] * len(vectors)
+        dim = len(query)
+        rows = [i for i, v in enumerate(vectors) if v and len(v) == dim]
+        if dim and rows:
+            q = np.asarray(query, dtype=np.float64)
+            norm_q = math.sqrt(float(q @ q))
+            if norm_q > 0:
+                m = np.array([vectors[i] for i in rows], dtype=np.float64)
+                norms = np.sqrt(np.einsum("ij,ij->i", m, m)) * norm_q
+                dots = m @ q
+                sims = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+                for i, sim in zip(rows, sims.tolist()):
+                    scores[i] = sim
+        for i, v in enumerate(vectors):
+            if v and len(v) != dim:
+                scores[i] = cosine_similarity(query, v)
+        return scores
+
+except ImportError:
+
+    cosine_similarity = _cosine_py
+
+    def cosine_batch(query: List[float], vectors: List[Optional[List[float]]]) -> List[float]:
+        """query 与多条向量的余弦相似度 (空向量得 0.0)"""
+        return [_cosine_py(query, v) if v else 0.0 for v in vectors]
+
+
 # 全局实例
 _embedding_service: Optional[EmbeddingService] = None
 
@@ -8,51 +8,386 @@ from __future__ import annotations
 
 import json
 import logging
+import math
+import os
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from functools import cached_property
 from typing import List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# orjson (可选): 加载索引时逐行解析 metadata JSON
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # pragma: no cover - 回退标准库
+    _json_loads = json.loads
+
 # ── 向量数学 ────────────────────────────────
 try:
     import numpy as np
 
-    def _cosine_batch(query: List[float], matrix: list, top_k: int) -> List[Tuple[int, float]]:
-        """批量余弦相似度 (numpy 加速)"""
-        q = np.array(query, dtype=np.float32)
-        m = np.array(matrix, dtype=np.float32)
+    # simsimd (可选): AVX2/AVX-512/NEON(含 int8 / VNNI) 内核一次算完整批点积
+    try:
+        import simsimd
+    except ImportError:
+        simsimd = None
+
+    # hnswlib (可选): 条目数超过 _ANN_MIN_SIZE 时用 HNSW 近似检索代替暴力扫描
+    try:
+        import hnswlib
+    except ImportError:
+        hnswlib = None
+
+    def _pack_embedding(vec) -> bytes:
+        """向量 → float32 原始字节 (rag_index.embedding BLOB)"""
+        return np.asarray(vec, dtype=np.float32).tobytes()
+
+    def _row_indices(rows: List[int]) -> np.ndarray:
+        """行号列表 → int32 数组 (矩阵 gather 一次完成)"""
+        return np.array(rows, dtype=np.int32)
+
+    def _unpack_embedding(raw: bytes):
+        return np.frombuffer(raw, dtype=np.float32)  # 零拷贝
+
+    # 有 simsimd 时矩阵按行量化为 int8 (每行一个 scale): 检索带宽降为 float32 的 1/4;
+    # 纯 numpy 的 int8 matmul 会溢出/需整体转型, 因此没有 simsimd 时保持 float32
+    _QUANTIZE = simsimd is not None
+
+    def _quantize(vec: np.ndarray) -> Tuple[np.ndarray, float]:
+        """float 向量 → (int8 向量, scale), vec ≈ int8 * scale"""
+        scale = float(np.abs(vec).max()) / 127.0 if vec.size else 0.0
+        if scale == 0:
+            return np.zeros(vec.shape, dtype=np.int8), 0.0
+        return np.round(vec / scale).astype(np.int8), scale
+
+    # simsimd 内核单线程运行且释放 GIL: 行数较多时按连续行分片, 在线程池上并行计算
+    # (纯 numpy 的 m @ q 由 BLAS 自行多线程, 不再分片, 避免线程超额)
+    _SEARCH_THREADS = min(os.cpu_count() or 1, 8)
+    _SHARD_MIN_ROWS = 4096
+    _search_executor: Optional[ThreadPoolExecutor] = None
+
+    def _map_shards(kernel, n: int) -> np.ndarray:
+        """kernel(lo, hi) 计算第 [lo, hi) 行的得分; 多核且行数足够时分片并行后拼接"""
+        if _SEARCH_THREADS < 2 or n < 2 * _SHARD_MIN_ROWS:
+            return kernel(0, n)
+        global _search_executor
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(max_workers=_SEARCH_THREADS, thread_name_prefix="rag-search")
+        step = max(_SHARD_MIN_ROWS, -(-n // _SEARCH_THREADS))
+        parts = _search_executor.map(lambda lo: kernel(lo, min(lo + step, n)), range(0, n, step))
+        return np.concatenate(list(parts))
+
+    def _cosine_batch(
+        query: List[float], matrix, top_k: int, scales: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """批量余弦相似度 (numpy 加速, 有 simsimd 时走 SIMD 内核)
+
+        matrix 的行已在写入时 L2 归一化 (零向量保持为零行), 只需归一化查询后做一次点积。
+        scales 非空时 matrix 为 int8 量化行, 查询同样量化后用 int8 点积内核。
+        """
+        q = np.asarray(query, dtype=np.float32)
+        m = matrix if isinstance(matrix, np.ndarray) else np.asarray(matrix, dtype=np.float32)
+        if m.ndim != 2 or q.shape[0] != m.shape[1]:
+            return []  # 查询向量与索引维度不一致 (例如 Provider 向量 vs TF-IDF)
         norm_q = np.linalg.norm(q)
         if norm_q == 0:
             return []
-        norms = np.linalg.norm(m, axis=1)
-        norms[norms == 0] = 1e-10
-        scores = m @ q / (norms * norm_q)
-        topk_idx = np.argsort(scores)[-top_k:][::-1]
+        q = q / norm_q
+        if scales is not None:
+            q8, q_scale = _quantize(q)
+            q8 = q8[None, :]
+            scores = _map_shards(
+                lambda lo, hi: np.asarray(simsimd.cdist(q8, m[lo:hi], metric="dot"))[0], m.shape[0],
+            ) * (scales * q_scale)
+        elif simsimd is not None:
+            q2 = q[None, :]
+            scores = _map_shards(
+                lambda lo, hi: np.asarray(simsimd.cdist(q2, m[lo:hi], metric="dot"))[0], m.shape[0],
+            )
+        else:
+            scores = m @ q
+        if 0 < top_k < scores.shape[0]:
+            # O(N) 选出前 k, 再只对这 k 个排序
+            topk_idx = np.argpartition(scores, -top_k)[-top_k:]
+            topk_idx = topk_idx[np.argsort(scores[topk_idx])[::-1]]
+        else:
+            topk_idx = np.argsort(scores)[-top_k:][::-1]
         return [(int(i), float(scores[i])) for i in topk_idx if scores[i] > 0]
 
+    class _Matrix:
+        """常驻的连续向量矩阵 (容量倍增), 第 i 行对应第 i 个条目
+
+        检索时直接在该矩阵上计算, 不再每次把 List[List[float]] 转成 ndarray。
+        行在写入时 L2 归一化 (余弦 = 点积, 检索时不再重算行范数),
+        _QUANTIZE 时再量化为 int8 并记录每行 scale。
+        维度由首条向量决定 (或 extend 时显式指定); 维度不同的向量记为零行 (永不命中),
+        当前维度已无存活条目时由 VectorIndex 按条目向量整体重建。
+        """
+        __slots__ = ("_data", "_scales", "_size")
+
+        def __init__(self):
+            self._data: Optional[np.ndarray] = None
+            self._scales: Optional[np.ndarray] = None
+            self._size = 0
+
+        def __len__(self) -> int:
+            return self._size
+
+        def _alloc(self, capacity: int, dim: int):
+            data = np.empty((capacity, dim), dtype=np.int8 if _QUANTIZE else np.float32)
+            scales = np.empty(capacity, dtype=np.float32) if _QUANTIZE else None
+            if self._data is not None and self._size:
+                data[:self._size] = self._data[:self._size]
+                if _QUANTIZE:
+                    scales[:self._size] = self._scales[:self._size]
+            self._data, self._scales = data, scales
+
+        def _store(self, idx: int, vec: List[float]):
+            dim = self._data.shape[1]
+            row = np.asarray(vec, dtype=np.float32).ravel()
+            if row.shape[0] != dim:
+                row = np.zeros(dim, dtype=np.float32)
+            norm = np.linalg.norm(row)
+            if norm > 0:
+                row = row / norm
+            if _QUANTIZE:
+                self._data[idx], self._scales[idx] = _quantize(row)
+            else:
+                self._data[idx] = row
+
+        def append(self, vec: List[float]):
+            if self._data is None or (self._size == 0 and len(vec) != self._data.shape[1]):
+                self._size = 0
+                self._alloc(16, len(vec))
+            elif self._size == self._data.shape[0]:
+                self._alloc(self._size * 2, self._data.shape[1])
+            self._store(self._size, vec)
+            self._size += 1
+
+        def __setitem__(self, idx: int, vec: List[float]):
+            self._store(idx, vec)
+
+        def extend(self, vectors: List[List[float]], dim: int = 0):
+            """批量追加 (加载 / 重建索引时使用): 整块一次归一化/量化, 不逐行调用 _store
+
+            dim 仅在矩阵为空时生效, 默认取首条向量的维度。
+            """
+            if not vectors:
+                return
+            if self._data is None or self._size == 0:
+                self._size = 0
+                self._alloc(max(16, len(vectors)), dim or len(vectors[0]))
+            elif self._size + len(vectors) > self._data.shape[0]:
+                self._alloc(max(self._size * 2, self._size + len(vectors)), self._data.shape[1])
+            dim = self._data.shape[1]
+            block = np.zeros((len(vectors), dim), dtype=np.float32)
+            for i, vec in enumerate(vectors):
+                if len(vec) == dim:
+                    block[i] = vec
+            norms = np.linalg.norm(block, axis=1)
+            nonzero = norms > 0
+            block[nonzero] /= norms[nonzero, None]
+            lo, hi = self._size, self._size + len(vectors)
+            if _QUANTIZE:
+                scales = np.abs(block).max(axis=1) / np.float32(127.0)
+                nonzero = scales > 0
+                data = np.zeros(block.shape, dtype=np.int8)
+                data[nonzero] = np.round(block[nonzero] / scales[nonzero, None])
+                self._data[lo:hi], self._scales[lo:hi] = data, scales
+            else:
+                self._data[lo:hi] = block
+            self._size = hi
+
+        def swap_remove(self, idx: int):
+            """用最后一行覆盖第 idx 行后缩短 (O(d), 不搬移后续行)"""
+            last = self._size - 1
+            if idx != last:
+                self._data[idx] = self._data[last]
+                if _QUANTIZE:
+                    self._scales[idx] = self._scales[last]
+            self._size = last
+
+        def clear(self):
+            self._size = 0
+
+        @property
+        def dim(self) -> int:
+            return 0 if self._data is None else self._data.shape[1]
+
+        def rows(self, indices: Optional[List[int]] = None) -> np.ndarray:
+            """全部行 (视图) 或指定行 (拷贝)"""
+            if self._data is None:
+                return np.empty((0, 0), dtype=np.float32)
+            view = self._data[:self._size]
+            return view if indices is None else view[indices]
+
+        def scales(self, indices: Optional[List[int]] = None) -> Optional[np.ndarray]:
+            """各行的量化 scale (未量化时为 None)"""
+            if self._scales is None:
+                return None
+            view = self._scales[:self._size]
+            return view if indices is None else view[indices]
+
+    class _AnnIndex:
+        """HNSW 近似近邻索引 (hnswlib, cosine 空间), 只覆盖与矩阵同维的非零向量
+
+        标签为自增整数, 不随条目 swap-remove 改变位置;
+        更新 = 标记删除旧标签 + 插入新标签, 删除过多时 (stale) 由 VectorIndex 整体重建。
+        """
+        __slots__ = ("dim", "_index", "_ids", "_labels", "_next", "_deleted")
+
+        def __init__(self, dim: int, capacity: int):
+            self.dim = dim
+            self._index = hnswlib.Index(space="cosine", dim=dim)
+            self._index.init_index(max_elements=max(capacity, 16), ef_construction=200, M=16)
+            self._ids: dict[int, str] = {}     # label → entry id
+            self._labels: dict[str, int] = {}  # entry id → label
+            self._next = 0
+            self._deleted = 0
+
+        @classmethod
+        def build(cls, entries: List[IndexEntry], dim: int) -> "_AnnIndex":
+            ann = cls(dim, len(entries) * 2)
+            ids, rows = [], []
+            for entry in entries:
+                row = ann._row(entry.embedding)
+                if row is not None:
+                    ids.append(entry.id)
+                    rows.append(row)
+            if rows:
+                labels = np.arange(len(rows))
+                ann._index.add_items(np.stack(rows), labels)  # 批量插入 (多线程)
+                ann._ids = dict(zip(labels.tolist(), ids))
+                ann._labels = dict(zip(ids, labels.tolist()))
+                ann._next = len(rows)
+            return ann
+
+        def _row(self, vec) -> Optional[np.ndarray]:
+            row = np.asarray(vec, dtype=np.float32).ravel()
+            if row.shape[0] != self.dim or not row.any():
+                return None  # 与矩阵一致: 异维/零向量永不命中
+            return row
+
+        def add(self, entry_id: str, vec: List[float]):
+            self.discard(entry_id)
+            row = self._row(vec)
+            if row is None:
+                return
+            if self._next >= self._index.get_max_elements():
+                self._index.resize_index(self._next * 2)
+            label = self._next
+            self._next += 1
+            self._index.add_items(row[None, :], [label])
+            self._ids[label] = entry_id
+            self._labels[entry_id] = label
+
+        def discard(self, entry_id: str):
+            label = self._labels.pop(entry_id, None)
+            if label is not None:
+                del self._ids[label]
+                self._index.mark_deleted(label)
+                self._deleted += 1
+
+        @property
+        def stale(self) -> bool:
+            """已删除标签超过存活数的 1/4: 图质量下降, 应重建"""
+            return self._deleted * 4 > len(self._labels)
+
+        def search(self, query: List[float], top_k: int) -> Optional[List[Tuple[str, float]]]:
+            """返回 [(entry_id, score), ...]; hnswlib 凑不足 k 个结果时返回 None (调用方回退暴力扫描)"""
+            q = np.asarray(query, dtype=np.float32).ravel()
+            if q.shape[0] != self.dim or not q.any():
+                return []
+            k = min(top_k, len(self._labels))
+            if k <= 0:
+                return []
+            self._index.set_ef(max(64, k * 2))  # ef 决定召回率, 且必须 >= k
+            try:
+                labels, distances = self._index.knn_query(q[None, :], k=k)
+            except RuntimeError:
+                return None
+            return [
+                (self._ids[label], 1.0 - dist)
+                for label, dist in zip(labels[0].tolist(), distances[0].tolist())
+                if dist < 1.0  # cosine 距离 = 1 - 相似度, 只保留正相似度
+            ]
+
     HAS_NUMPY = True
 except ImportError:
     HAS_NUMPY = False
+    hnswlib = None
+
+    from array import array
+    from operator import mul
+
+    def _pack_embedding(vec) -> bytes:
+        """向量 → float32 原始字节 (rag_index.embedding BLOB)"""
+        return array("f", vec).tobytes()
+
+    def _row_indices(rows: List[int]) -> List[int]:
+        return rows
 
-    def _cosine_batch(query: List[float], matrix: list, top_k: int) -> List[Tuple[int, float]]:
-        """纯 Python 余弦相似度"""
-        import math
-        norm_q = math.sqrt(sum(x * x for x in query))
+    def _unpack_embedding(raw: bytes) -> List[float]:
+        vec = array("f")
+        vec.frombytes(raw)
+        return vec.tolist()
+
+    def _unit(vec: List[float]) -> array:
+        """L2 归一化为紧凑的 float32 array (每元素 4 字节, 而非 list 中的 float 对象)"""
+        norm = math.sqrt(sum(map(mul, vec, vec)))
+        return array("f", [x / norm for x in vec] if norm > 0 else vec)
+
+    class _Matrix(list):
+        """纯 Python 向量矩阵 (list of array('f'), 行已 L2 归一化), 接口与 numpy 版一致"""
+
+        dim = 0  # 各行独立存储, 没有统一维度, 无需重建
+
+        def append(self, vec: List[float]):
+            super().append(_unit(vec))
+
+        def __setitem__(self, idx: int, vec: List[float]):
+            super().__setitem__(idx, _unit(vec))
+
+        def extend(self, vectors: List[List[float]], dim: int = 0):
+            super().extend(map(_unit, vectors))
+
+        def swap_remove(self, idx: int):
+            last = self.pop()
+            if idx < len(self):
+                list.__setitem__(self, idx, last)
+
+        def rows(self, indices: Optional[List[int]] = None) -> list:
+            return self if indices is None else [self[i] for i in indices]
+
+        def scales(self, indices: Optional[List[int]] = None) -> None:
+            return None
+
+    def _cosine_batch(query: List[float], matrix: list, top_k: int, scales=None) -> List[Tuple[int, float]]:
+        """纯 Python 余弦相似度 (matrix 行已归一化)
+
+        点积用 sum(map(mul, ...)): 逐元素循环在 C 层完成, 不经生成器字节码。
+        """
+        norm_q = math.sqrt(sum(map(mul, query, query)))
         if norm_q == 0:
             return []
+        q = [x / norm_q for x in query]
         results = []
         for idx, row in enumerate(matrix):
-            dot = sum(a * b for a, b in zip(query, row))
-            norm_r = math.sqrt(sum(x * x for x in row))
-            if norm_r == 0:
-                continue
-            score = dot / (norm_q * norm_r)
+            score = sum(map(mul, q, row))
             if score > 0:
                 results.append((idx, score))
         results.sort(key=lambda x: -x[1])
         return results[:top_k]
 
+# source_filter 前缀 → 行号的缓存条数 (LRU)
+_SOURCE_ROWS_CACHE_SIZE = 64
+
+# 达到该条目数才启用 HNSW: 更小的索引上 (int8/SIMD) 暴力扫描既精确又足够快
+_ANN_MIN_SIZE = 10_000
+
 
 # ── 索引条目 ─────────────────────────────────
 @dataclass
@@ -60,7 +395,7 @@ class IndexEntry:
     """索引中的单条记录"""
     id: str
     content: str
-    embedding: List[float]
+    embedding: List[float]  # 从数据库加载的条目为 float32 数组
     source: str = ""
     chunk_type: str = "text"
     start_line: int = 0
@@ -68,6 +403,15 @@ class IndexEntry:
     metadata: dict = field(default_factory=dict)
     updated_at: float = 0.0
 
+    # 关键词检索用的派生数据: 首次访问时计算并缓存 (upsert 总是替换整个条目, 无需失效)
+    @cached_property
+    def content_lower(self) -> str:
+        return self.content.lower()
+
+    @cached_property
+    def word_count(self) -> int:
+        return len(self.content_lower.split())
+
 
 class VectorIndex:
     """
@@ -79,9 +423,18 @@ class VectorIndex:
 
     def __init__(self):
         self._entries: List[IndexEntry] = []
-        self._matrix: List[List[float]] = []
+        self._matrix = _Matrix()
         self._id_map: dict[str, int] = {}  # id → index position
+        self._by_source: dict[str, set[str]] = {}  # source → ids (按文件批量删除)
+        self._dim_counts: dict[int, int] = {}  # 向量维度 → 条目数 (矩阵维度失效时重选)
         self._dirty = False
+        # 自上次保存以来的变更 (save_to_db 只写这些行)
+        self._changed_ids: set[str] = set()
+        self._removed_ids: set[str] = set()
+        self._cleared = True  # 未从数据库加载过: 首次保存需全量替换
+        self._ann: Optional[_AnnIndex] = None  # 首次大索引检索时惰性构建, 之后随写入增量维护
+        # source_filter 前缀 → 升序行号; 条目位置或来源变化时整体失效
+        self._source_rows_cache: OrderedDict[str, object] = OrderedDict()
 
     @property
     def size(self) -> int:
@@ -94,30 +447,99 @@ class VectorIndex:
         entry.updated_at = time.time()
         if entry.id in self._id_map:
             idx = self._id_map[entry.id]
+            old = self._entries[idx]
+            if old.source != entry.source:
+                self._unlink_source(old)
+                self._source_rows_cache.clear()
             self._entries[idx] = entry
             self._matrix[idx] = entry.embedding
+            self._count_dim(old.embedding, -1)
         else:
             self._id_map[entry.id] = len(self._entries)
             self._entries.append(entry)
             self._matrix.append(entry.embedding)
+            self._source_rows_cache.clear()
+        self._count_dim(entry.embedding, 1)
+        self._check_matrix_dim()
+        if self._ann is not None:
+            self._ann.add(entry.id, entry.embedding)
+        self._by_source.setdefault(entry.source, set()).add(entry.id)
+        self._changed_ids.add(entry.id)
+        self._removed_ids.discard(entry.id)
         self._dirty = True
 
+    def _unlink_source(self, entry: IndexEntry):
+        ids = self._by_source.get(entry.source)
+        if ids is not None:
+            ids.discard(entry.id)
+            if not ids:
+                del self._by_source[entry.source]
+
+    def _count_dim(self, vec, delta: int):
+        dim = len(vec)
+        count = self._dim_counts.get(dim, 0) + delta
+        if count > 0:
+            self._dim_counts[dim] = count
+        else:
+            self._dim_counts.pop(dim, None)
+
+    def _majority_dim(self) -> int:
+        return max(self._dim_counts, key=self._dim_counts.get) if self._dim_counts else 0
+
+    def _check_matrix_dim(self):
+        """矩阵维度已无存活条目时 (例如 TF-IDF 全部换成 Provider 向量), 按多数维度整体重建矩阵"""
+        dim = self._matrix.dim
+        if not dim or dim in self._dim_counts or not self._entries:
+            return
+        self._matrix.clear()
+        self._matrix.extend([entry.embedding for entry in self._entries], dim=self._majority_dim())
+        logger.info("RAG 向量矩阵维度 %d → %d, 已重建 (%d 条)", dim, self._matrix.dim, self.size)
+
     def remove(self, entry_id: str):
         """删除条目"""
         if entry_id not in self._id_map:
             return
+        # 与最后一条交换后删除: 只需更新被移动条目的位置, 不必重建 id_map
         idx = self._id_map.pop(entry_id)
-        self._entries.pop(idx)
-        self._matrix.pop(idx)
-        # 重建 id_map
-        self._id_map = {e.id: i for i, e in enumerate(self._entries)}
+        removed = self._entries[idx]
+        self._unlink_source(removed)
+        last = self._entries.pop()
+        if idx < len(self._entries):
+            self._entries[idx] = last
+            self._id_map[last.id] = idx
+        self._matrix.swap_remove(idx)
+        self._count_dim(removed.embedding, -1)
+        self._check_matrix_dim()
+        self._source_rows_cache.clear()
+        if self._ann is not None:
+            self._ann.discard(entry_id)
+        self._changed_ids.discard(entry_id)
+        self._removed_ids.add(entry_id)
         self._dirty = True
 
+    def source_entries(self, source: str) -> List[IndexEntry]:
+        """某个来源文件的全部条目"""
+        return [self._entries[self._id_map[entry_id]] for entry_id in self._by_source.get(source, ())]
+
+    def remove_by_source(self, source: str) -> int:
+        """删除某个来源文件的全部条目, 返回删除数"""
+        ids = self._by_source.pop(source, ())
+        for entry_id in ids:
+            self.remove(entry_id)
+        return len(ids)
+
     def clear(self):
         """清空索引"""
         self._entries.clear()
         self._matrix.clear()
         self._id_map.clear()
+        self._by_source.clear()
+        self._dim_counts.clear()
+        self._changed_ids.clear()
+        self._removed_ids.clear()
+        self._ann = None
+        self._source_rows_cache.clear()
+        self._cleared = True
         self._dirty = True
 
     # ── 检索 ──
@@ -135,22 +557,56 @@ class VectorIndex:
         Returns:
             [(IndexEntry, score), ...] 按相似度降序
         """
-        if not self._matrix:
+        if not self._entries:
             return []
 
         # 过滤
         if source_filter:
-            indices = [i for i, e in enumerate(self._entries) if e.source.startswith(source_filter)]
-            matrix = [self._matrix[i] for i in indices]
-        else:
-            indices = list(range(len(self._entries)))
-            matrix = self._matrix
-
-        if not matrix:
-            return []
-
-        matches = _cosine_batch(query_embedding, matrix, top_k)
-        return [(self._entries[indices[idx]], score) for idx, score in matches]
+            indices = self._source_rows(source_filter)
+            if not len(indices):
+                return []
+            matches = _cosine_batch(
+                query_embedding, self._matrix.rows(indices), top_k, self._matrix.scales(indices),
+            )
+            return [(self._entries[indices[idx]], score) for idx, score in matches]
+
+        ann = self._ann_index() if top_k > 0 else None
+        if ann is not None:
+            hits = ann.search(query_embedding, top_k)
+            if hits is not None:
+                return [(self._entries[self._id_map[entry_id]], score) for entry_id, score in hits]
+
+        matches = _cosine_batch(query_embedding, self._matrix.rows(), top_k, self._matrix.scales())
+        return [(self._entries[idx], score) for idx, score in matches]
+
+    def _source_rows(self, prefix: str):
+        """来源以 prefix 开头的条目行号 (升序); 按文件遍历 _by_source, 结果 LRU 缓存"""
+        cache = self._source_rows_cache
+        rows = cache.get(prefix)
+        if rows is not None:
+            cache.move_to_end(prefix)
+            return rows
+        id_map = self._id_map
+        rows = _row_indices(sorted(
+            id_map[entry_id]
+            for source, ids in self._by_source.items() if source.startswith(prefix)
+            for entry_id in ids
+        ))
+        cache[prefix] = rows
+        if len(cache) > _SOURCE_ROWS_CACHE_SIZE:
+            cache.popitem(last=False)
+        return rows
+
+    def _ann_index(self) -> Optional[_AnnIndex]:
+        """大索引返回 (必要时构建/重建) HNSW 索引; 小索引或无 hnswlib 时返回 None"""
+        if hnswlib is None or self.size < _ANN_MIN_SIZE:
+            self._ann = None
+            return None
+        if self._ann is None or self._ann.stale or self._ann.dim != self._matrix.dim:
+            started = time.perf_counter()
+            self._ann = _AnnIndex.build(self._entries, self._matrix.dim)
+            logger.info("RAG HNSW 索引已构建 (%d 条, %.2fs)", self.size, time.perf_counter() - started)
+        return self._ann
 
     # ── 持久化 ──
 
@@ -164,7 +620,7 @@ class VectorIndex:
             CREATE TABLE IF NOT EXISTS rag_index (
                 id TEXT PRIMARY KEY,
                 content TEXT NOT NULL,
-                embedding TEXT NOT NULL,
+                embedding BLOB NOT NULL,
                 source TEXT DEFAULT '',
                 chunk_type TEXT DEFAULT 'text',
                 start_line INTEGER DEFAULT 0,
@@ -173,60 +629,91 @@ class VectorIndex:
                 updated_at REAL DEFAULT 0
             )
         """))
-        # 全量替换 (简单实现)
-        await db_session.execute(text("DELETE FROM rag_index"))
-        for entry in self._entries:
+        # 增量写入: 只删除/写入自上次保存以来变更的行, 单事务 + executemany
+        if self._cleared:
+            await db_session.execute(text("DELETE FROM rag_index"))
+        if self._removed_ids:
             await db_session.execute(
-                text("""INSERT INTO rag_index (id, content, embedding, source, chunk_type,
+                text("DELETE FROM rag_index WHERE id = :id"),
+                [{"id": entry_id} for entry_id in self._removed_ids],
+            )
+        if self._changed_ids:
+            await db_session.execute(
+                text("""INSERT OR REPLACE INTO rag_index (id, content, embedding, source, chunk_type,
                         start_line, end_line, metadata, updated_at)
                         VALUES (:id, :content, :embedding, :source, :chunk_type,
                                 :start_line, :end_line, :metadata, :updated_at)"""),
-                {
-                    "id": entry.id,
-                    "content": entry.content,
-                    "embedding": json.dumps(entry.embedding),
-                    "source": entry.source,
-                    "chunk_type": entry.chunk_type,
-                    "start_line": entry.start_line,
-                    "end_line": entry.end_line,
-                    "metadata": json.dumps(entry.metadata),
-                    "updated_at": entry.updated_at,
-                },
+                [_entry_params(self._entries[self._id_map[entry_id]]) for entry_id in self._changed_ids],
             )
         await db_session.commit()
+        logger.info(
+            "RAG 索引已保存 (%d 条, 写入 %d, 删除 %d)",
+            self.size, len(self._changed_ids), len(self._removed_ids),
+        )
+        self._changed_ids.clear()
+        self._removed_ids.clear()
+        self._cleared = False
         self._dirty = False
-        logger.info("RAG 索引已保存 (%d 条)", self.size)
 
     async def load_from_db(self, db_session):
-        """从 SQLite 加载索引"""
+        """从 SQLite 加载索引
+
+        流式读取结果行 (不一次性 fetchall), 全部条目读完后向量整块写入矩阵。
+        """
         from sqlalchemy import text
         try:
-            rows = await db_session.execute(text("SELECT * FROM rag_index"))
-            rows = rows.fetchall()
+            result = await db_session.stream(text("SELECT * FROM rag_index"))
         except Exception:
             return  # 表不存在
 
         self.clear()
-        for row in rows:
+        entries = self._entries
+        id_map = self._id_map
+        by_source = self._by_source
+        async for row in result:
+            raw = row[2]
             entry = IndexEntry(
                 id=row[0],
                 content=row[1],
-                embedding=json.loads(row[2]),
+                # float32 BLOB; 旧版本写入的是 JSON 文本
+                embedding=_unpack_embedding(raw) if isinstance(raw, bytes) else _json_loads(raw),
                 source=row[3],
                 chunk_type=row[4],
                 start_line=row[5],
                 end_line=row[6],
-                metadata=json.loads(row[7]) if row[7] else {},
+                metadata=_json_loads(row[7]) if row[7] else {},
                 updated_at=row[8],
             )
-            self._id_map[entry.id] = len(self._entries)
-            self._entries.append(entry)
-            self._matrix.append(entry.embedding)
-
+            id_map[entry.id] = len(entries)
+            entries.append(entry)
+            by_source.setdefault(entry.source, set()).add(entry.id)
+            self._count_dim(entry.embedding, 1)
+        # 新旧维度混存时 (如 TF-IDF 升级到 Provider 向量), 以条目最多的维度建矩阵
+        self._matrix.extend([entry.embedding for entry in entries], dim=self._majority_dim())
+
+        # 与数据库一致: 清除 clear() 留下的变更标记
+        self._changed_ids.clear()
+        self._removed_ids.clear()
+        self._cleared = False
         self._dirty = False
         logger.info("RAG 索引已加载 (%d 条)", self.size)
 
 
+def _entry_params(entry: IndexEntry) -> dict:
+    """IndexEntry → rag_index 行参数"""
+    return {
+        "id": entry.id,
+        "content": entry.content,
+        "embedding": _pack_embedding(entry.embedding),
+        "source": entry.source,
+        "chunk_type": entry.chunk_type,
+        "start_line": entry.start_line,
+        "end_line": entry.end_line,
+        "metadata": json.dumps(entry.metadata),
+        "updated_at": entry.updated_at,
+    }
+
+
 # ── 全局单例 ──
 
 _vector_index: Optional[VectorIndex] = None
@@ -12,10 +12,10 @@ import logging
 import os
 import time
 from pathlib import Path
-from typing import Optional, Set
+from typing import List, Optional, Set
 
 from backend.ai.rag.chunker import CodeChunker, TextChunker, Chunk
-from backend.ai.rag.embeddings import EmbeddingService, get_embedding_service
+from backend.ai.rag.embeddings import TFIDF_DIM, EmbeddingService, get_embedding_service
 from backend.ai.rag.index import VectorIndex, IndexEntry, get_vector_index
 
 logger = logging.getLogger(__name__)
@@ -42,6 +42,8 @@ SKIP_DIRS = {
     ".idea", ".vscode", "vendor",
 }
 
+INDEXED_EXTENSIONS = frozenset(CODE_EXTENSIONS | TEXT_EXTENSIONS)
+
 MAX_FILE_SIZE = 512 * 1024  # 512 KB
 BATCH_SIZE = 20  # 每批次处理的文件数
 
@@ -69,7 +71,7 @@ class BackgroundIndexer:
         self._code_chunker = CodeChunker(max_chunk_tokens=max_chunk_tokens)
         self._text_chunker = TextChunker(max_chunk_tokens=max_chunk_tokens)
 
-        self._indexed_files: dict[str, float] = {}  # path → last_modified
+        self._indexed_files: dict[str, tuple[float, int]] = {}  # path → (mtime, size)
         self._running = False
         self._task: Optional[asyncio.Task] = None
 
@@ -111,25 +113,21 @@ class BackgroundIndexer:
         files = self._scan_files()
         stats["scanned"] = len(files)
 
-        # 过滤需更新的文件
+        # 过滤需更新的文件 (mtime/size 与上次索引时一致则跳过)
         to_index = []
-        for fpath in files:
-            try:
-                mtime = os.path.getmtime(fpath)
-                if fpath in self._indexed_files and self._indexed_files[fpath] >= mtime:
-                    stats["skipped"] += 1
-                    continue
-                to_index.append((fpath, mtime))
-            except OSError:
+        for fpath, sig in files:
+            if self._indexed_files.get(fpath) == sig:
                 stats["skipped"] += 1
+                continue
+            to_index.append((fpath, sig))
 
         # 批量处理
         for i in range(0, len(to_index), BATCH_SIZE):
             batch = to_index[i:i + BATCH_SIZE]
-            for fpath, mtime in batch:
+            for fpath, sig in batch:
                 try:
                     await self._index_file(fpath)
-                    self._indexed_files[fpath] = mtime
+                    self._indexed_files[fpath] = sig
                     stats["indexed"] += 1
                 except Exception as e:
                     logger.warning("索引文件失败 %s: %s", fpath, e)
@@ -159,30 +157,46 @@ class BackgroundIndexer:
                 logger.error("索引循环异常: %s", e)
             await asyncio.sleep(interval)
 
-    def _scan_files(self) -> list[str]:
-        """扫描工作区文件"""
+    def _scan_files(self) -> list[tuple[str, tuple[float, int]]]:
+        """扫描工作区文件 → [(path, (mtime, size))]
+
+        os.scandir 遍历, 每个文件只 stat 一次 (DirEntry 缓存), 不再分别调用 getsize / getmtime。
+        """
         result = []
-        allowed_exts = CODE_EXTENSIONS | TEXT_EXTENSIONS
         base = Path(self.workspace_path)
 
         if not base.exists():
             return result
 
-        for root, dirs, files in os.walk(base):
-            # 跳过不需要的目录
-            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
-
-            for fname in files:
-                ext = os.path.splitext(fname)[1].lower()
-                if ext not in allowed_exts:
-                    continue
-                fpath = os.path.join(root, fname)
-                try:
-                    if os.path.getsize(fpath) > MAX_FILE_SIZE:
-                        continue
-                except OSError:
-                    continue
-                result.append(fpath)
+        stack = [str(base)]
+        while stack:
+            root = stack.pop()
+            subdirs = []
+            try:
+                with os.scandir(root) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir():
+                                # 跳过不需要的目录; 与 os.walk 一致, 不进入符号链接目录
+                                name = entry.name
+                                if (
+                                    name not in SKIP_DIRS
+                                    and not name.startswith(".")
+                                    and not entry.is_symlink()
+                                ):
+                                    subdirs.append(entry.path)
+                                continue
+                            if os.path.splitext(entry.name)[1].lower() not in INDEXED_EXTENSIONS:
+                                continue
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        if st.st_size > MAX_FILE_SIZE:
+                            continue
+                        result.append((entry.path, (st.st_mtime, st.st_size)))
+            except OSError:
+                continue
+            stack.extend(reversed(subdirs))
 
         return result
 
@@ -197,52 +211,89 @@ class BackgroundIndexer:
         if not content.strip():
             return
 
-        # 先删除该文件的旧条目
-        old_ids = [eid for eid, idx in self._index._id_map.items()
-                   if self._index._entries[idx].source == fpath]
-        for oid in old_ids:
-            self._index.remove(oid)
+        # 取相对路径作为 source
+        rel = os.path.relpath(fpath, self.workspace_path)
+
+        # 旧条目的向量按块内容留存: 未改动的块直接复用, 不再请求 embedding
+        # (TF-IDF 回退向量不复用, Provider 恢复后这些块会重新向量化)
+        reusable = {
+            entry.content: entry.embedding
+            for entry in self._index.source_entries(rel)
+            if len(entry.embedding) != TFIDF_DIM
+        }
+
+        # 先删除该文件的旧条目 (条目 source 是相对路径)
+        self._index.remove_by_source(rel)
 
         # 分块
         ext = os.path.splitext(fpath)[1].lower()
         if ext in CODE_EXTENSIONS:
-            # 取相对路径作为 source
-            rel = os.path.relpath(fpath, self.workspace_path)
             chunks = self._code_chunker.chunk_file(content, rel)
         else:
-            rel = os.path.relpath(fpath, self.workspace_path)
             chunks = self._text_chunker.chunk_text(content, rel)
 
         # 向量化 + 入库 (批量 embedding，减少请求频率)
-        valid_chunks = [chunk for chunk in chunks if chunk.content.strip()]
-        for i in range(0, len(valid_chunks), self._embed_batch_size):
-            batch_chunks = valid_chunks[i:i + self._embed_batch_size]
-            texts = [chunk.content for chunk in batch_chunks]
-
-            try:
-                embeddings = await self._embedder.embed(texts)
-            except Exception:
+        to_embed = []
+        for chunk in chunks:
+            if not chunk.content.strip():
                 continue
+            embedding = reusable.get(chunk.content)
+            if embedding is None:
+                to_embed.append(chunk)
+            else:
+                self._upsert_chunk(chunk, embedding)
+        batches = [
+            to_embed[i:i + self._embed_batch_size]
+            for i in range(0, len(to_embed), self._embed_batch_size)
+        ]
 
-            # 批次间延迟, 降低 embedding API 请求频率
-            if self._batch_delay > 0 and i + self._embed_batch_size < len(valid_chunks):
-                await asyncio.sleep(self._batch_delay)
-
+        async for batch_chunks, embeddings in self._embed_batches(batches):
             for chunk, embedding in zip(batch_chunks, embeddings):
-                entry_id = hashlib.md5(
-                    f"{chunk.source}:{chunk.start_line}:{chunk.end_line}:{chunk.content[:50]}".encode()
-                ).hexdigest()
-
-                self._index.upsert(IndexEntry(
-                    id=entry_id,
-                    content=chunk.content,
-                    embedding=embedding,
-                    source=chunk.source,
-                    chunk_type=chunk.chunk_type,
-                    start_line=chunk.start_line,
-                    end_line=chunk.end_line,
-                    metadata=chunk.metadata or {},
-                ))
+                self._upsert_chunk(chunk, embedding)
+
+    def _upsert_chunk(self, chunk: Chunk, embedding: List[float]):
+        """块 + 向量 → 索引条目"""
+        # blake2b(16 字节) 与 md5 同为 32 位 hex, C 实现更快;
+        # 旧 id 不受影响: 重新索引文件时先按 source 整体移除
+        entry_id = hashlib.blake2b(
+            f"{chunk.source}:{chunk.start_line}:{chunk.end_line}:{chunk.content[:50]}".encode(),
+            digest_size=16,
+        ).hexdigest()
+
+        self._index.upsert(IndexEntry(
+            id=entry_id,
+            content=chunk.content,
+            embedding=embedding,
+            source=chunk.source,
+            chunk_type=chunk.chunk_type,
+            start_line=chunk.start_line,
+            end_line=chunk.end_line,
+            metadata=chunk.metadata or {},
+        ))
+
+    async def _embed_batches(self, batches: List[List[Chunk]]):
+        """逐批产出 (chunks, embeddings); 失败的批次跳过"""
+        if self._batch_delay > 0:
+            # 配置了批次间延迟 (限流保护): 逐批串行发送
+            for n, batch_chunks in enumerate(batches):
+                try:
+                    embeddings = await self._embedder.embed([c.content for c in batch_chunks])
+                except Exception:
+                    continue
+                yield batch_chunks, embeddings
+                # 批次间延迟, 降低 embedding API 请求频率
+                if n + 1 < len(batches):
+                    await asyncio.sleep(self._batch_delay)
+            return
+
+        # 无延迟: 各批并发请求 (并发上限由 Provider 信号量控制)
+        results = await asyncio.gather(
+            *(self._embedder.embed([c.content for c in b]) for b in batches),
+            return_exceptions=True,
+        )
+        for batch_chunks, embeddings in zip(batches, results):
+            if not isinstance(embeddings, BaseException):
+                yield batch_chunks, embeddings
 
 
 # ── 全局单例 ──
@@ -5,9 +5,9 @@ Hybrid Retriever: 向量检索 + 关键词匹配, 支持 rerank。
 """
 from __future__ import annotations
 
-import hashlib
 import logging
 import re
+from collections import Counter
 from dataclasses import dataclass
 from typing import List, Optional, Tuple
 
@@ -15,6 +15,9 @@ from backend.ai.rag.index import VectorIndex, IndexEntry, get_vector_index
 
 logger = logging.getLogger(__name__)
 
+# 英文单词 + 中文字符 (作用于 lower() 后的文本)
+_TOKEN_RE = re.compile(r'[a-z_][a-z0-9_]*|[\u4e00-\u9fff]+')
+
 
 @dataclass
 class RetrievalResult:
@@ -26,6 +29,7 @@ class RetrievalResult:
     end_line: int = 0
     chunk_type: str = "text"
     match_type: str = "vector"  # vector / keyword / hybrid
+    entry_id: str = ""  # 对应 IndexEntry.id, 用于合并去重
 
 
 class RAGRetriever:
@@ -80,7 +84,7 @@ class RAGRetriever:
         if mode in ("vector", "hybrid") and self._index.size > 0:
             vec_results = await self._vector_search(query, k * 2, source_filter)
             for r in vec_results:
-                rid = self._result_id(r)
+                rid = r.entry_id
                 if rid not in results:
                     results[rid] = r
                 else:
@@ -90,7 +94,7 @@ class RAGRetriever:
         if mode in ("keyword", "hybrid") and self._index.size > 0:
             kw_results = self._keyword_search(query, k * 2, source_filter)
             for r in kw_results:
-                rid = self._result_id(r)
+                rid = r.entry_id
                 if rid not in results:
                     results[rid] = r
                 else:
@@ -132,6 +136,7 @@ class RAGRetriever:
                 end_line=entry.end_line,
                 chunk_type=entry.chunk_type,
                 match_type="vector",
+                entry_id=entry.id,
             )
             for entry, score in matches
         ]
@@ -144,20 +149,20 @@ class RAGRetriever:
         if not tokens:
             return []
 
+        # 重复 token 合并为 (token, 次数): 每个不同子串对每篇文档只扫描一次
+        # (str.count 为 C 实现的非重叠计数; Aho-Corasick 会计入重叠匹配, 语义不同)
+        weighted = list(Counter(tokens).items())
+
         scored: List[Tuple[IndexEntry, float]] = []
         for entry in self._index._entries:
             if source_filter and not entry.source.startswith(source_filter):
                 continue
-            content_lower = entry.content.lower()
-            score = 0.0
-            for token in tokens:
-                count = content_lower.count(token)
-                if count > 0:
-                    # TF 部分 (简化)
-                    tf = count / (len(content_lower.split()) + 1)
-                    score += tf
-            if score > 0:
-                scored.append((entry, score))
+            content_lower = entry.content_lower  # 条目上缓存, 不再每次查询重算
+            count = content_lower.count
+            hits = sum(count(token) * n for token, n in weighted)
+            if hits > 0:
+                # TF 部分 (简化): 各 token 共用同一分母, 命中后才取文档词数
+                scored.append((entry, hits / (entry.word_count + 1)))
 
         # 归一化
         if scored:
@@ -175,6 +180,7 @@ class RAGRetriever:
                 end_line=entry.end_line,
                 chunk_type=entry.chunk_type,
                 match_type="keyword",
+                entry_id=entry.id,
             )
             for entry, score in scored[:top_k]
         ]
@@ -182,15 +188,7 @@ class RAGRetriever:
     @staticmethod
     def _tokenize(text: str) -> List[str]:
         """简易分词"""
-        text = text.lower()
-        # 英文单词 + 中文字符
-        words = re.findall(r'[a-z_][a-z0-9_]*|[\u4e00-\u9fff]+', text)
-        return [w for w in words if len(w) > 1]
-
-    @staticmethod
-    def _result_id(r: RetrievalResult) -> str:
-        """生成结果去重 ID"""
-        return hashlib.md5(f"{r.source}:{r.start_line}:{r.end_line}".encode()).hexdigest()
+        return [w for w in _TOKEN_RE.findall(text.lower()) if len(w) > 1]
 
 
 # ── 全局单例 ──
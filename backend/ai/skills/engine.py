@@ -9,13 +9,57 @@ Skills — 技能执行引擎
 """
 from __future__ import annotations
 
+import functools
+import json
 import logging
 import re
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+# output_format 解析用的模式 (模块加载时编译一次)
+_HEADER_RE = re.compile(r'^#{1,3}\s+(.+)$', re.MULTILINE)
+_FIELD_RE = re.compile(r'\{(\w+)\}')
+
+# orjson (可选): 校验 JSON 输出时优先使用
+try:
+    from orjson import loads as _fast_json_loads
+except ImportError:  # pragma: no cover - 回退标准库
+    _fast_json_loads = None
+
+# json.loads 可接受的文档首字符 (跳过 JSON 空白后): 对象 / 数组 / 字符串 / 数字 / 字面量 / NaN / Infinity
+_JSON_START_CHARS = frozenset('{["-0123456789tfnNI')
+
+# 属性缺失标记 (区分 "不存在" 与 "值为 None")
+_MISSING = object()
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_format(fmt: str) -> Tuple[Tuple[Tuple[str, str], ...], Tuple[str, ...], bool]:
+    """解析 output_format → ((章节标题, 小写标题), 占位字段, 是否要求 JSON); 同一格式串只解析一次"""
+    needs_json = "json" in fmt.lower() or fmt.startswith("{")
+    headers = tuple((h, h.lower()) for h in _HEADER_RE.findall(fmt))
+    return headers, tuple(_FIELD_RE.findall(fmt)), needs_json
+
+
+def _is_valid_json(text: str) -> bool:
+    """text 能否被 json.loads 解析 (结果与 json.loads 一致, 只是更快)"""
+    # 首字符探测: 明显不是 JSON 的输出 (如 Markdown) 不再进入解析器
+    if text.lstrip(" \t\n\r")[:1] not in _JSON_START_CHARS:
+        return False
+    if _fast_json_loads is not None:
+        try:
+            _fast_json_loads(text)
+            return True
+        except ValueError:
+            pass  # orjson 更严格 (NaN / 超大浮点 / 孤立代理项), 交给标准库确认
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
 
 @dataclass
 class SkillSpec:
@@ -34,19 +78,29 @@ class SkillSpec:
 
     @classmethod
     def from_orm(cls, skill_obj) -> "SkillSpec":
-        """从 ORM Skill 对象构建"""
+        """从 ORM Skill 对象构建
+
+        已加载的列值直接从实例 __dict__ 读取 (一次字典查找); 不在其中的属性
+        (未加载 / 非 ORM 对象的 property 等) 仍回退到 getattr, 取值语义不变。
+        """
+        values = getattr(skill_obj, "__dict__", None) or {}
+
+        def get(name: str, default: Any = None) -> Any:
+            value = values.get(name, _MISSING)
+            return getattr(skill_obj, name, default) if value is _MISSING else value
+
         return cls(
-            id=skill_obj.id,
-            name=skill_obj.name,
-            category=getattr(skill_obj, "category", "general"),
-            icon=getattr(skill_obj, "icon", "⚡"),
-            description=getattr(skill_obj, "description", ""),
-            instruction_prompt=getattr(skill_obj, "instruction_prompt", ""),
-            output_format=getattr(skill_obj, "output_format", ""),
-            examples=getattr(skill_obj, "examples", None) or [],
-            constraints=getattr(skill_obj, "constraints", None) or [],
-            recommended_tools=getattr(skill_obj, "recommended_tools", None) or [],
-            tags=getattr(skill_obj, "tags", None) or [],
+            id=values["id"] if "id" in values else skill_obj.id,
+            name=values["name"] if "name" in values else skill_obj.name,
+            category=get("category", "general"),
+            icon=get("icon", "⚡"),
+            description=get("description", ""),
+            instruction_prompt=get("instruction_prompt", ""),
+            output_format=get("output_format", ""),
+            examples=get("examples") or [],
+            constraints=get("constraints") or [],
+            recommended_tools=get("recommended_tools") or [],
+            tags=get("tags") or [],
         )
 
 
@@ -58,6 +112,48 @@ class SkillPrompt:
     constraints: List[str]  # 约束列表
 
 
+@functools.lru_cache(maxsize=256)
+def _render_skill_block(
+    icon: str, name: str, description: str, instruction_prompt: str, output_format: str,
+    examples: Tuple[Tuple[Any, Any], ...], recommended_tools: Tuple[str, ...], constraints: Tuple[str, ...],
+) -> str:
+    """拼装单个技能的 prompt 块 (参数均为可哈希值, 结果由 lru_cache 复用)"""
+    parts = [f"### {icon} 技能: {name}"]
+
+    if description:
+        parts.append(f"_{description}_")
+
+    # 核心指令
+    if instruction_prompt:
+        parts.append(instruction_prompt)
+
+    # 输出格式
+    if output_format:
+        parts.append(f"\n**输出格式:**\n```\n{output_format}\n```")
+
+    # Few-shot 示例 (调用方已截取前 3 个)
+    if examples:
+        parts.append("\n**示例:**")
+        for i, (inp, out) in enumerate(examples, 1):
+            if inp and out:
+                parts.append(f"\n示例 {i}:")
+                parts.append(f"输入: {inp}")
+                parts.append(f"输出: {out}")
+
+    # 工具提示
+    if recommended_tools:
+        tools_str = ", ".join(f"`{t}`" for t in recommended_tools)
+        parts.append(f"\n推荐工具: {tools_str}")
+
+    # 技能级约束
+    if constraints:
+        parts.append("\n约束:")
+        for c in constraints:
+            parts.append(f"  - {c}")
+
+    return "\n".join(parts)
+
+
 class SkillEngine:
     """
     技能执行引擎
@@ -83,34 +179,23 @@ class SkillEngine:
             return SkillPrompt(system_block="", tool_hints=[], constraints=[])
 
         blocks: List[str] = []
-        all_tools: List[str] = []
-        all_constraints: List[str] = []
-
         for skill in skills:
             block = self._build_skill_block(skill)
             if block:
                 blocks.append(block)
-            all_tools.extend(skill.recommended_tools)
-            all_constraints.extend(skill.constraints)
-
-        # 去重工具
-        seen_tools = set()
-        unique_tools = []
-        for t in all_tools:
-            if t not in seen_tools:
-                seen_tools.add(t)
-                unique_tools.append(t)
 
-        # 去重约束
-        unique_constraints = list(dict.fromkeys(all_constraints))
+        # 去重工具 / 约束 (保持首次出现顺序, 不生成中间列表)
+        unique_tools = list(dict.fromkeys(t for s in skills for t in s.recommended_tools))
+        unique_constraints = list(dict.fromkeys(c for s in skills for c in s.constraints))
 
         system_block = ""
         if blocks:
-            system_block = "## 活跃技能\n\n" + "\n\n".join(blocks)
+            # 片段先收集到列表, 最后一次 join (不在循环中 += 反复拷贝)
+            parts = ["## 活跃技能\n\n", "\n\n".join(blocks)]
             if unique_constraints:
-                system_block += "\n\n### 全局约束\n"
-                for c in unique_constraints:
-                    system_block += f"- {c}\n"
+                parts.append("\n\n### 全局约束\n")
+                parts.extend(f"- {c}\n" for c in unique_constraints)
+            system_block = "".join(parts)
 
         return SkillPrompt(
             system_block=system_block,
@@ -119,43 +204,17 @@ class SkillEngine:
         )
 
     def _build_skill_block(self, skill: SkillSpec) -> str:
-        """为单个技能构建 prompt 块"""
-        parts = [f"### {skill.icon} 技能: {skill.name}"]
-
-        if skill.description:
-            parts.append(f"_{skill.description}_")
-
-        # 核心指令
-        if skill.instruction_prompt:
-            parts.append(skill.instruction_prompt)
-
-        # 输出格式
-        if skill.output_format:
-            parts.append(f"\n**输出格式:**\n```\n{skill.output_format}\n```")
-
-        # Few-shot 示例
-        if skill.examples:
-            parts.append("\n**示例:**")
-            for i, ex in enumerate(skill.examples[:3], 1):
-                inp = ex.get("input", "")
-                out = ex.get("output", "")
-                if inp and out:
-                    parts.append(f"\n示例 {i}:")
-                    parts.append(f"输入: {inp}")
-                    parts.append(f"输出: {out}")
-
-        # 工具提示
-        if skill.recommended_tools:
-            tools_str = ", ".join(f"`{t}`" for t in skill.recommended_tools)
-            parts.append(f"\n推荐工具: {tools_str}")
-
-        # 技能级约束
-        if skill.constraints:
-            parts.append("\n约束:")
-            for c in skill.constraints:
-                parts.append(f"  - {c}")
-
-        return "\n".join(parts)
+        """为单个技能构建 prompt 块 (按内容缓存: 技能不变时每轮对话不再重复拼装)"""
+        key = (
+            skill.icon, skill.name, skill.description, skill.instruction_prompt, skill.output_format,
+            tuple((ex.get("input", ""), ex.get("output", "")) for ex in skill.examples[:3]),
+            tuple(skill.recommended_tools), tuple(skill.constraints),
+        )
+        try:
+            hash(key)
+        except TypeError:  # 示例等字段含不可哈希的值: 直接拼装, 不缓存
+            return _render_skill_block.__wrapped__(*key)
+        return _render_skill_block(*key)
 
     def prioritize_tools(
         self,
@@ -198,24 +257,19 @@ class SkillEngine:
             return {"valid": True, "issues": []}
 
         issues = []
-        fmt = skill.output_format.strip()
+        headers, fields, needs_json = _parse_format(skill.output_format.strip())
 
         # 检查是否要求 JSON
-        if "json" in fmt.lower() or fmt.startswith("{"):
-            import json as json_mod
-            try:
-                json_mod.loads(output)
-            except (json_mod.JSONDecodeError, ValueError):
-                issues.append("输出不是有效的 JSON 格式")
+        if needs_json and not _is_valid_json(output):
+            issues.append("输出不是有效的 JSON 格式")
 
         # 检查必需的 section headers
-        headers = re.findall(r'^#{1,3}\s+(.+)$', fmt, re.MULTILINE)
-        for header in headers:
-            if header.lower() not in output.lower():
-                issues.append(f"缺少章节: {header}")
+        output_lower = output.lower()
+        issues.extend(
+            f"缺少章节: {header}" for header, header_lower in headers if header_lower not in output_lower
+        )
 
         # 检查必需的字段
-        fields = re.findall(r'\{(\w+)\}', fmt)
         for f in fields:
             # 占位符应该已被替换
             if f"{{{f}}}" in output:
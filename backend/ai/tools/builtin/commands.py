@@ -4,8 +4,10 @@
 run_command (只读白名单), run_command_unrestricted (写命令, 需审批)
 """
 import asyncio
+import functools
 import os
 import re as _re
+import shlex
 from typing import Any, Dict, Set, Optional
 
 import logging
@@ -33,9 +35,23 @@ READONLY_COMMANDS: Dict[str, Optional[Set[str]]] = {
     "docker": {"ps", "images", "logs", "inspect", "stats", "top", "version", "info"},
     "docker-compose": {"ps", "logs", "config", "images"},
 }
+# 不限制子命令的只读命令
+_READONLY_ANY_ARGS = frozenset(cmd for cmd, subs in READONLY_COMMANDS.items() if subs is None)
+# 其余命令: 命令 → 允许的子命令
+_READONLY_SUBCOMMANDS: Dict[str, frozenset] = {
+    cmd: frozenset(subs) for cmd, subs in READONLY_COMMANDS.items() if subs is not None
+}
+
+# 写操作符 / 命令拼接 / 命令替换: >, >>, &&, ;, | tee, `...`, $(...)
+_WRITE_OPS_RE = _re.compile(r'>|&&|;|\|\s*tee\b|`|\$\(')
 
 # 极端危险模式 (任何情况都阻止)
 LETHAL_PATTERNS = ["rm -rf /", "mkfs", "> /dev/", ":(){ :|:& };:", "shutdown", "reboot"]
+# 合并为一个交替正则: 一次扫描命令串即可判断是否命中任一模式
+_LETHAL_RE = _re.compile("|".join(_re.escape(p) for p in LETHAL_PATTERNS))
+
+# 只含这些字符的命令 (无管道 / 通配 / 变量 / 重定向 / 转义等 shell 语义) 可由 shlex 切分后直接 exec
+_PLAIN_COMMAND_RE = _re.compile(r'[\w \t\-./:=,@+%\'"]+')
 
 # 输出截断限制
 MAX_CMD_OUTPUT = 8000
@@ -54,40 +70,62 @@ def is_readonly_command(command_str: str) -> bool:
     if not stripped:
         return False
 
-    # 检测写操作符
-    if _re.search(r'>{1,2}', stripped):
-        return False
-    if '&&' in stripped or ';' in stripped:
-        return False
-    if _re.search(r'\|\s*tee\b', stripped):
-        return False
-    if '`' in stripped or '$(' in stripped:
+    # 检测写操作符 (一次扫描)
+    if _WRITE_OPS_RE.search(stripped):
         return False
 
     # 管道链检查
-    pipe_segments = [s.strip() for s in stripped.split('|') if s.strip()]
-    for seg in pipe_segments:
-        parts = seg.split()
+    for seg in stripped.split('|'):
+        parts = seg.split(None, 2)  # 只需命令和子命令
         if not parts:
-            return False
+            continue  # 空段 (如 "a || b" 之间)
         cmd = os.path.basename(parts[0])
 
-        allowed_subs = READONLY_COMMANDS.get(cmd)
-        if allowed_subs is None and cmd in READONLY_COMMANDS:
+        if cmd in _READONLY_ANY_ARGS:
             continue
-        if allowed_subs is not None:
-            if len(parts) >= 2 and parts[1] in allowed_subs:
-                continue
-            elif len(parts) < 2:
-                continue
-            else:
-                return False
-        else:
+        allowed_subs = _READONLY_SUBCOMMANDS.get(cmd)
+        if allowed_subs is None:
+            return False
+        if len(parts) >= 2 and parts[1] not in allowed_subs:
             return False
 
     return True
 
 
+@functools.cache
+def _tool_env() -> Dict[str, str]:
+    """子进程环境变量 (首次调用时复制一次): .env 只在启动时加载进 os.environ, 之后不再变化"""
+    return {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+
+
+def _find_lethal_pattern(command: str) -> Optional[str]:
+    """返回命令中包含的危险模式 (按 LETHAL_PATTERNS 顺序取第一个), 无则 None"""
+    if _LETHAL_RE.search(command) is None:
+        return None
+    # 命中时 (少见) 再按列表顺序定位, 提示信息与逐个检查时一致
+    return next(p for p in LETHAL_PATTERNS if p in command)
+
+
+async def _spawn_readonly(command: str, workspace: str) -> asyncio.subprocess.Process:
+    """启动只读命令: 简单命令直接 exec (省去中间的 /bin/sh), 其余交给 shell"""
+    if _PLAIN_COMMAND_RE.fullmatch(command):
+        try:
+            return await asyncio.create_subprocess_exec(
+                *shlex.split(command), cwd=workspace,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=_tool_env(),
+            )
+        except (ValueError, OSError):
+            pass  # 引号不配对 / 命令不存在等: 交给 shell, 保持其报错与退出码
+    return await asyncio.create_subprocess_shell(
+        command, cwd=workspace,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=_tool_env(),
+    )
+
+
 def _format_command_output(command: str, stdout: bytes, stderr: bytes, returncode: int) -> str:
     """格式化命令输出"""
     out = stdout.decode("utf-8", errors="replace").strip()
@@ -113,9 +151,9 @@ async def tool_run_command(args: Dict[str, Any], workspace: str) -> str:
         return "⚠️ 请指定要执行的命令"
 
     # 安全检查
-    for pattern in LETHAL_PATTERNS:
-        if pattern in command:
-            return f"⚠️ 命令包含危险模式: '{pattern}'，已阻止执行"
+    pattern = _find_lethal_pattern(command)
+    if pattern is not None:
+        return f"⚠️ 命令包含危险模式: '{pattern}'，已阻止执行"
 
     if not is_readonly_command(command):
         return (
@@ -126,12 +164,7 @@ async def tool_run_command(args: Dict[str, Any], workspace: str) -> str:
         )
 
     try:
-        proc = await asyncio.create_subprocess_shell(
-            command, cwd=workspace,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
-        )
+        proc = await _spawn_readonly(command, workspace)
         stdout, stderr = await asyncio.wait_for(
             proc.communicate(), timeout=COMMAND_TIMEOUT_SECONDS
         )
@@ -148,16 +181,16 @@ async def tool_run_command_unrestricted(args: Dict[str, Any], workspace: str) ->
     if not command:
         return "⚠️ 请指定要执行的命令"
 
-    for pattern in LETHAL_PATTERNS:
-        if pattern in command:
-            return f"⚠️ 命令包含极端危险模式: '{pattern}'，已阻止执行"
+    pattern = _find_lethal_pattern(command)
+    if pattern is not None:
+        return f"⚠️ 命令包含极端危险模式: '{pattern}'，已阻止执行"
 
     try:
         proc = await asyncio.create_subprocess_shell(
             command, cwd=workspace,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+            env=_tool_env(),
         )
         stdout, stderr = await asyncio.wait_for(
             proc.communicate(), timeout=COMMAND_TIMEOUT_SECONDS * 2
@@ -5,9 +5,14 @@ read_file, search_text, list_directory, get_file_tree
 """
 import asyncio
 import fnmatch
+import functools
+import io
 import os
 import re
-from typing import Any, Dict, List, Tuple
+import shutil
+import time
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import logging
 
@@ -41,9 +46,12 @@ MAX_READ_LINES = 200
 MAX_SEARCH_RESULTS = 30
 SEARCH_CONTEXT_LINES = 1
 TOOL_TIMEOUT_SECONDS = 10
+MAX_OUTPUT_LINES = 120   # search_text 输出行数上限
+MAX_OUTPUT_CHARS = 6000  # search_text 输出字符上限
 
 # 目录树限制
 MAX_TREE_DEPTH = 4
+MAX_SUBDIR_COUNT = 1000  # list_directory 统计子目录条目数的上限 (超过显示 "1000+")
 TREE_SKIP_DIRS = {
     "node_modules", "__pycache__", ".git", ".venv", "venv",
     "dist", ".claude", "studio-data", "data", ".idea", ".vscode",
@@ -51,9 +59,33 @@ TREE_SKIP_DIRS = {
     ".next", ".nuxt", "build", "target",
 }
 
+# search_text 的 grep 固定参数 (模块加载时生成一次)
+_GREP_BASE_ARGS: Tuple[str, ...] = (
+    "-B", str(SEARCH_CONTEXT_LINES), "-A", str(SEARCH_CONTEXT_LINES),
+    "-m", str(MAX_SEARCH_RESULTS),
+    *(arg for d in TREE_SKIP_DIRS for arg in ("--exclude-dir", d)),
+    *(arg for ext in SENSITIVE_EXTENSIONS for arg in ("--exclude", f"*{ext}")),
+    "--exclude", ".env*",
+)
+
 
 # ==================== 路径安全检查 ====================
 
+# 工作区根目录的 realpath 缓存 (workspace → (realpath, 过期时刻)); 短 TTL 兼顾根目录符号链接变更
+_WORKSPACE_REAL_TTL_SECONDS = 60.0
+_workspace_real_cache: Dict[str, Tuple[str, float]] = {}
+
+
+def _workspace_realpath(workspace: str) -> str:
+    now = time.monotonic()
+    cached = _workspace_real_cache.get(workspace)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    real = os.path.realpath(workspace)
+    _workspace_real_cache[workspace] = (real, now + _WORKSPACE_REAL_TTL_SECONDS)
+    return real
+
+
 def validate_path(workspace: str, rel_path: str) -> Tuple[bool, str, str]:
     """
     验证路径安全性
@@ -62,30 +94,27 @@ def validate_path(workspace: str, rel_path: str) -> Tuple[bool, str, str]:
         (is_safe, absolute_path, error_message)
     """
     rel_path = rel_path.strip().lstrip("/")
+    # 目标路径每次都重新解析: 缓存它会让"先合法、后被换成外链"的路径绕过越界检查
     abs_path = os.path.realpath(os.path.join(workspace, rel_path))
-    workspace_real = os.path.realpath(workspace)
+    workspace_real = _workspace_realpath(workspace)
     if not abs_path.startswith(workspace_real + os.sep) and abs_path != workspace_real:
         return False, abs_path, f"⚠️ 路径越界: '{rel_path}' 不在项目目录内"
     return True, abs_path, ""
 
 
+_BACKSLASH_TO_SLASH = str.maketrans("\\", "/")
+
+
 def is_sensitive_file(rel_path: str) -> bool:
     """检查文件是否在敏感黑名单中"""
     basename = os.path.basename(rel_path)
-    _, ext = os.path.splitext(basename)
-
     if basename in CONFIG_ALLOWLIST:
         return False
-    if basename in SENSITIVE_PATTERNS:
-        return True
-    if ext.lower() in SENSITIVE_EXTENSIONS:
-        return True
 
-    path_parts = rel_path.replace("\\", "/").split("/")
-    for part in path_parts:
-        if part in SENSITIVE_PATTERNS:
-            return True
-    return False
+    # 路径各段 (含文件名) 一次集合判交, 不再逐段查找
+    if not SENSITIVE_PATTERNS.isdisjoint(rel_path.translate(_BACKSLASH_TO_SLASH).split("/")):
+        return True
+    return os.path.splitext(basename)[1].lower() in SENSITIVE_EXTENSIONS
 
 
 # ==================== read_file ====================
@@ -117,20 +146,22 @@ async def tool_read_file(args: Dict[str, Any], workspace: str) -> str:
         return f"⚠️ 文件过大 ({file_size / 1024:.0f}KB)，请指定行范围读取"
 
     try:
-        with open(abs_path, "r", encoding="utf-8", errors="replace") as f:
-            lines = f.readlines()
+        with open(abs_path, "rb") as f:
+            data = f.read()
     except UnicodeDecodeError:
         return f"⚠️ '{path}' 是二进制文件，无法读取"
 
-    total_lines = len(lines)
+    total_lines = _count_text_lines(data)
     start = max(1, start_line or 1)
     end = min(total_lines, end_line or (start + MAX_READ_LINES - 1))
 
     if end - start + 1 > MAX_READ_LINES:
         end = start + MAX_READ_LINES - 1
 
-    selected = lines[start - 1:end]
-    content = "".join(selected)
+    # 只解码到所需的最后一行, 不把整个文件拆成行列表
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", errors="replace")
+    stop = end if end >= 0 else max(0, total_lines + end)  # 与原先 lines[start - 1:end] 的切片语义一致
+    content = "".join(islice(text, start - 1, max(stop, start - 1)))
 
     header = f"📄 {path} (行 {start}-{end}, 共 {total_lines} 行)"
     if end < total_lines:
@@ -139,8 +170,22 @@ async def tool_read_file(args: Dict[str, Any], workspace: str) -> str:
     return f"{header}\n```\n{content}```"
 
 
+def _count_text_lines(data: bytes) -> int:
+    """文本模式 readlines() 会得到的行数 (\n / \r\n / 单独 \r 均为换行), 在字节上按 C 层计数"""
+    if not data:
+        return 0
+    newlines = data.count(b"\n") + data.count(b"\r") - data.count(b"\r\n")
+    return newlines + (data[-1:] not in (b"\n", b"\r"))
+
+
 # ==================== search_text ====================
 
+@functools.cache
+def _grep_path() -> Optional[str]:
+    """grep 可执行文件路径 (首次调用时探测一次), 不存在则 None"""
+    return shutil.which("grep")
+
+
 async def tool_search_text(args: Dict[str, Any], workspace: str) -> str:
     """全文搜索"""
     query = args.get("query", "")
@@ -150,20 +195,11 @@ async def tool_search_text(args: Dict[str, Any], workspace: str) -> str:
     if not query:
         return "⚠️ 请指定搜索内容"
 
-    cmd = ["grep", "-rn", "--color=never"]
-    if is_regex:
-        cmd.append("-E")
-    else:
-        cmd.append("-F")
-
-    cmd.extend(["-B", str(SEARCH_CONTEXT_LINES), "-A", str(SEARCH_CONTEXT_LINES)])
-    cmd.extend(["-m", str(MAX_SEARCH_RESULTS)])
+    grep = _grep_path()
+    if grep is None:  # 无 grep (精简镜像): 直接走 Python 实现, 不再每次 exec 失败
+        return await _python_search(query, is_regex, include_pattern, workspace)
 
-    for skip_dir in TREE_SKIP_DIRS:
-        cmd.extend(["--exclude-dir", skip_dir])
-    for ext in SENSITIVE_EXTENSIONS:
-        cmd.extend(["--exclude", f"*{ext}"])
-    cmd.extend(["--exclude", ".env*"])
+    cmd = [grep, "-rn", "--color=never", "-E" if is_regex else "-F", *_GREP_BASE_ARGS]
 
     if include_pattern:
         clean_pattern = include_pattern
@@ -180,9 +216,21 @@ async def tool_search_text(args: Dict[str, Any], workspace: str) -> str:
         proc = await asyncio.create_subprocess_exec(
             *cmd, cwd=workspace,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
         )
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=TOOL_TIMEOUT_SECONDS)
+        try:
+            # 只读到足以判定截断的部分 (多 1 行 / 足够的字节), 不缓冲全部 grep 输出
+            stdout = await asyncio.wait_for(
+                _read_limited(proc.stdout, MAX_OUTPUT_LINES + 1, MAX_OUTPUT_CHARS * 4 + 4096),
+                timeout=TOOL_TIMEOUT_SECONDS,
+            )
+        finally:
+            if proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
         output = stdout.decode("utf-8", errors="replace").strip()
 
         if not output:
@@ -190,8 +238,6 @@ async def tool_search_text(args: Dict[str, Any], workspace: str) -> str:
 
         output = output.replace("\n./", "\n").lstrip("./")
 
-        MAX_OUTPUT_LINES = 120
-        MAX_OUTPUT_CHARS = 6000
         lines = output.split("\n")
         if len(lines) > MAX_OUTPUT_LINES:
             output = "\n".join(lines[:MAX_OUTPUT_LINES])
@@ -208,6 +254,46 @@ async def tool_search_text(args: Dict[str, Any], workspace: str) -> str:
         return await _python_search(query, is_regex, include_pattern, workspace)
 
 
+async def _read_limited(stream: asyncio.StreamReader, max_lines: int, max_bytes: int) -> bytes:
+    """读取子进程输出, 达到 max_lines 个换行或 max_bytes 字节后停止 (其余输出丢弃)
+
+    max_bytes 按 UTF-8 每字符至多 4 字节留足余量, 保证截断后的字符数判定与读完全部输出时一致。
+    """
+    chunks: List[bytes] = []
+    size = lines = 0
+    while size < max_bytes and lines < max_lines:
+        chunk = await stream.read(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+    return b"".join(chunks)
+
+
+def _find_lines(text: str, needle: str) -> Iterator[int]:
+    """needle 出现在 text 中的行号 (0 起, 升序, 每行至多一次)
+
+    等价于逐行判断 needle in line (line 含行尾 "\n"): 只有末尾的 "\n" 能落在单行内,
+    中间含换行的关键词不会命中任何行。
+    """
+    if "\n" in needle[:-1]:
+        return
+    find = text.find
+    line = 0
+    line_start = 0
+    pos = find(needle)
+    while pos != -1:
+        line += text.count("\n", line_start, pos)
+        yield line
+        nl = find("\n", pos)  # 本行行尾: 从下一行开始继续查找
+        if nl == -1:
+            return
+        line += 1
+        line_start = nl + 1
+        pos = find(needle, line_start)
+
+
 async def _python_search(
     query: str, is_regex: bool, include_pattern: str, workspace: str,
 ) -> str:
@@ -219,6 +305,11 @@ async def _python_search(
             return f"⚠️ 无效的正则表达式: {e}"
     else:
         pattern = None
+    needle = None if pattern else query.lower()
+    # 文件名过滤的 glob 只编译一次 (与 fnmatch.fnmatch 相同: 两侧都经 normcase)
+    include_match = None
+    if include_pattern:
+        include_match = re.compile(fnmatch.translate(os.path.normcase(include_pattern))).match
 
     results: List[str] = []
     count = 0
@@ -228,31 +319,43 @@ async def _python_search(
         for fname in files:
             if count >= MAX_SEARCH_RESULTS:
                 break
+            # 先按文件名过滤 (最便宜), 再计算相对路径做敏感文件检查
+            if include_match and not include_match(os.path.normcase(fname)):
+                continue
             rel_path = os.path.relpath(os.path.join(root, fname), workspace)
             if is_sensitive_file(rel_path):
                 continue
-            if include_pattern and not fnmatch.fnmatch(fname, include_pattern):
-                continue
 
             try:
                 with open(os.path.join(root, fname), "r", encoding="utf-8", errors="replace") as f:
-                    file_lines = f.readlines()
+                    content = f.read()
             except Exception:
                 continue
 
-            for i, line in enumerate(file_lines):
+            if needle is not None:
+                # 纯文本查询在整篇小写文本上用 str.find 定位命中行: 不含关键词的文件 (绝大多数)
+                # 一次 C 层判定即跳过, 命中的文件也不再逐行 lower() 比较
+                content_lower = content.lower()
+                if needle not in content_lower:
+                    continue
+                hit_lines = _find_lines(content_lower, needle)
+            else:
+                hit_lines = None
+            file_lines = io.StringIO(content).readlines()
+            if hit_lines is None:
+                hit_lines = (i for i, line in enumerate(file_lines) if pattern.search(line))
+
+            for i in hit_lines:
                 if count >= MAX_SEARCH_RESULTS:
                     break
-                matched = bool(pattern.search(line)) if pattern else (query.lower() in line.lower())
-                if matched:
-                    count += 1
-                    ctx_start = max(0, i - SEARCH_CONTEXT_LINES)
-                    ctx_end = min(len(file_lines), i + SEARCH_CONTEXT_LINES + 1)
-                    ctx = ""
-                    for j in range(ctx_start, ctx_end):
-                        prefix = ">" if j == i else " "
-                        ctx += f"{prefix} {j+1}: {file_lines[j]}"
-                    results.append(f"{rel_path}:{i+1}\n{ctx}")
+                count += 1
+                ctx_start = max(0, i - SEARCH_CONTEXT_LINES)
+                ctx_end = min(len(file_lines), i + SEARCH_CONTEXT_LINES + 1)
+                ctx = ""
+                for j in range(ctx_start, ctx_end):
+                    prefix = ">" if j == i else " "
+                    ctx += f"{prefix} {j+1}: {file_lines[j]}"
+                results.append(f"{rel_path}:{i+1}\n{ctx}")
 
     if not results:
         return f"🔍 未找到匹配: '{query}'"
@@ -277,27 +380,23 @@ async def tool_list_directory(args: Dict[str, Any], workspace: str) -> str:
     if not os.path.isdir(abs_path):
         return f"⚠️ '{path}' 不是目录 (请使用 read_file 读取文件)"
 
+    # scandir: 类型与 stat 由目录项缓存, 不再逐项 join + isdir/getsize
     try:
-        entries = sorted(os.listdir(abs_path))
+        with os.scandir(abs_path) as it:
+            entries = sorted(
+                (e for e in it if e.name not in TREE_SKIP_DIRS and not e.name.startswith("__pycache__")),
+                key=lambda e: e.name,
+            )
     except PermissionError:
         return f"⚠️ 无权访问: '{path}'"
 
-    entries = [e for e in entries if e not in TREE_SKIP_DIRS and not e.startswith("__pycache__")]
-
     dirs_list = []
     files_list = []
     for entry in entries:
-        full = os.path.join(abs_path, entry)
-        if os.path.isdir(full):
-            try:
-                sub_count = len(os.listdir(full))
-            except Exception:
-                sub_count = 0
-            dirs_list.append(f"📁 {entry}/ ({sub_count} items)")
+        if entry.is_dir():
+            dirs_list.append(f"📁 {entry.name}/ ({_count_entries(entry.path)} items)")
         else:
-            size = os.path.getsize(full)
-            size_str = f"{size}B" if size < 1024 else f"{size / 1024:.1f}KB" if size < 1048576 else f"{size / 1048576:.1f}MB"
-            files_list.append(f"📄 {entry} ({size_str})")
+            files_list.append(f"📄 {entry.name} ({_format_size(entry.stat().st_size)})")
 
     display_path = path or "."
     result = f"📂 {display_path}/\n"
@@ -307,6 +406,32 @@ async def tool_list_directory(args: Dict[str, Any], workspace: str) -> str:
     return result
 
 
+def _format_size(size: int) -> str:
+    """文件大小 → "123B" / "1.5KB" / "2.0MB" (整数运算, 一位小数的舍入与 :.1f 一致)"""
+    if size < 1024:
+        return f"{size}B"
+    shift, unit = (10, "KB") if size < 1048576 else (20, "MB")
+    tenths, rem = divmod(size * 10, 1 << shift)
+    half = 1 << (shift - 1)
+    if rem > half or (rem == half and tenths & 1):  # 四舍六入五成双, 同浮点格式化
+        tenths += 1
+    return f"{tenths // 10}.{tenths % 10}{unit}"
+
+
+def _count_entries(path: str) -> str:
+    """目录下的条目数, 超过 MAX_SUBDIR_COUNT 即停止计数 (显示为 "N+")"""
+    count = 0
+    try:
+        with os.scandir(path) as it:
+            for _ in it:
+                count += 1
+                if count > MAX_SUBDIR_COUNT:
+                    return f"{MAX_SUBDIR_COUNT}+"
+    except OSError:
+        return "0"
+    return str(count)
+
+
 # ==================== get_file_tree ====================
 
 async def tool_get_file_tree(args: Dict[str, Any], workspace: str) -> str:
@@ -328,31 +453,51 @@ async def tool_get_file_tree(args: Dict[str, Any], workspace: str) -> str:
     return f"🌳 {display_path}/ 目录树 (深度: {max_depth}):\n\n{tree}"
 
 
-def _build_tree(path: str, max_depth: int, prefix: str = "", depth: int = 0) -> str:
-    """递归构建目录树"""
-    if depth >= max_depth:
-        return ""
-
+def _tree_entries(path: str):
+    """目录树中某目录的可见条目 (按名称排序); 无权限时返回 None"""
     try:
-        entries = sorted(os.listdir(path))
+        with os.scandir(path) as it:
+            return sorted(
+                (e for e in it if e.name not in TREE_SKIP_DIRS and not e.name.startswith(".")),
+                key=lambda e: e.name,
+            )
     except PermissionError:
-        return f"{prefix}(无权限访问)\n"
+        return None
 
-    entries = [e for e in entries if e not in TREE_SKIP_DIRS and not e.startswith(".")]
 
-    lines = []
-    for i, entry in enumerate(entries):
+def _build_tree(path: str, max_depth: int) -> str:
+    """构建目录树 (迭代 DFS: 所有行追加到同一列表, 最后只 join 一次)"""
+    if max_depth <= 0:
+        return ""
+    entries = _tree_entries(path)
+    if entries is None:
+        return "(无权限访问)\n"
+
+    lines: List[str] = []
+    # 栈帧: [条目列表, 下一个下标, 行前缀, 深度]
+    stack = [[entries, 0, "", 0]]
+    while stack:
+        frame = stack[-1]
+        entries, i, prefix, depth = frame
+        if i == len(entries):
+            stack.pop()
+            continue
+        frame[1] = i + 1
+
+        entry = entries[i]
         is_last = i == len(entries) - 1
         connector = "└── " if is_last else "├── "
-        full_path = os.path.join(path, entry)
-
-        if os.path.isdir(full_path):
-            lines.append(f"{prefix}{connector}{entry}/")
-            extension = "    " if is_last else "│   "
-            subtree = _build_tree(full_path, max_depth, prefix + extension, depth + 1)
-            if subtree:
-                lines.append(subtree)
+
+        if entry.is_dir():
+            lines.append(f"{prefix}{connector}{entry.name}/")
+            if depth + 1 < max_depth:
+                child_prefix = prefix + ("    " if is_last else "│   ")
+                children = _tree_entries(entry.path)
+                if children is None:
+                    lines.append(f"{child_prefix}(无权限访问)\n")
+                elif children:
+                    stack.append([children, 0, child_prefix, depth + 1])
         else:
-            lines.append(f"{prefix}{connector}{entry}")
+            lines.append(f"{prefix}{connector}{entry.name}")
 
     return "\n".join(lines)
@@ -10,10 +10,12 @@
   - 并行执行支持
 """
 import asyncio
+import functools
 import logging
-from typing import Any, Callable, Dict, List, Optional, Set
+import time
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Set, Tuple, TypeVar
 
-from .registry import TOOL_PERMISSION_MAP, DEFAULT_PERMISSIONS
+from .registry import DEFAULT_PERMISSIONS, TOOL_PERMISSION_MAP, TOOLS_DENIED_BY_DEFAULT
 from .builtin.file_ops import (
     tool_read_file,
     tool_search_text,
@@ -31,9 +33,56 @@ from .builtin.interaction import tool_ask_user
 
 logger = logging.getLogger(__name__)
 
+# asyncio.timeout (3.11+) 直接在当前 Task 内计时, 不像 wait_for 那样额外包一层 Task
+try:
+    from asyncio import timeout as _async_timeout
+except ImportError:  # pragma: no cover - Python 3.10
+    _async_timeout = None
+
+_T = TypeVar("_T")
+
+
+async def _run_with_timeout(coro: Awaitable[_T], timeout: float) -> _T:
+    """带超时地等待 coro, 超时抛出 asyncio.TimeoutError"""
+    if _async_timeout is None:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    async with _async_timeout(timeout):
+        return await coro
+
 # 类型: 命令审批回调
 CommandApprovalCallback = Optional[Any]
 
+# 错误提示模板 (集中定义, 各路径共用)
+_MSG_TOOL_DISABLED = "⚠️ 工具 '{}' 已被项目管理员禁用"
+_MSG_TOOL_UNKNOWN = "⚠️ 未知工具: '{}'"
+_MSG_TOOL_TIMEOUT = "⚠️ 工具 '{}' 执行超时 ({}s)"
+_MSG_TOOL_FAILED = "⚠️ 工具执行失败: {}"
+_MSG_COMMAND_TIMEOUT = "⚠️ 命令执行超时"
+_MSG_COMMAND_FAILED = "⚠️ 命令执行失败: {}"
+_MSG_COMMAND_NOT_PERMITTED = (
+    "⚠️ 此命令不在只读白名单中，且项目未开启「执行写入命令」权限。\n"
+    "命令: {}\n\n"
+    "只读命令示例: git log, git diff, ls, cat, grep, find, python3 -c 等\n"
+    "如需执行此命令，请让用户在工具面板中开启「⚠️ 执行写入命令」权限。"
+)
+_MSG_COMMAND_REJECTED = (
+    "⚠️ 用户拒绝执行此命令。\n"
+    "命令: {}\n"
+    "原因: {}\n\n"
+    "请改用只读命令获取信息，或向用户解释为什么需要执行此命令后再次尝试。"
+)
+
+# 命令审批范围 → 提示文案
+_SCOPE_LABELS: Dict[str, str] = {
+    "once": "本次", "session": "本会话",
+    "project": "本项目", "permanent": "永久", "rule": "规则匹配",
+}
+
+# 审批范围 → 结果前缀 (导入时拼好)
+_APPROVAL_PREFIXES: Dict[str, str] = {
+    scope: f"✅ 用户已授权执行 ({label})\n\n" for scope, label in _SCOPE_LABELS.items()
+}
+
 # 内置工具执行器映射
 _TOOL_EXECUTORS: Dict[str, Callable] = {
     "read_file": tool_read_file,
@@ -44,6 +93,47 @@ _TOOL_EXECUTORS: Dict[str, Callable] = {
     "run_command": tool_run_command,
 }
 
+# 工具名 → (所需权限, 执行器): 一次查表拿到分派所需的全部信息。
+# run_command 的执行器为 None, 走只读 / 审批路由
+_BUILTIN_DISPATCH: Dict[str, Tuple[Optional[FrozenSet[str]], Optional[Callable]]] = {
+    name: (TOOL_PERMISSION_MAP.get(name), None if name == "run_command" else executor)
+    for name, executor in _TOOL_EXECUTORS.items()
+}
+
+
+# 只读判定缓存只收短命令 (git status / ls / cat X 这类反复出现的), 长脚本直接判定
+_READONLY_CACHE_MAX_LEN = 256
+
+
+@functools.lru_cache(maxsize=512)
+def _is_readonly_cached(command: str) -> bool:
+    return is_readonly_command(command)
+
+
+def _is_readonly(command: str) -> bool:
+    """is_readonly_command 的缓存版本 (按命令串)"""
+    if len(command) > _READONLY_CACHE_MAX_LEN:
+        return is_readonly_command(command)
+    return _is_readonly_cached(command)
+
+
+# 与 backend.services.mcp.tool_adapter.MCP_TOOL_PREFIX 一致 (此处不导入 MCP 包)
+_MCP_TOOL_PREFIX = "mcp_"
+
+
+@functools.lru_cache(maxsize=256)
+def _is_mcp_tool_name(name: str) -> bool:
+    """是否为 MCP 工具 (按工具名缓存; 首次调用才导入 MCP 包, 不拖慢本模块导入)"""
+    from backend.services.mcp.tool_adapter import is_mcp_tool
+    return is_mcp_tool(name)
+
+
+@functools.cache
+def _mcp_execution_adapter():
+    """MCPExecutionAdapter (首次路由到 MCP 工具时导入一次)"""
+    from backend.services.mcp.execution_adapter import MCPExecutionAdapter
+    return MCPExecutionAdapter
+
 
 async def execute_tool(
     name: str,
@@ -69,45 +159,46 @@ async def execute_tool(
     Returns:
         工具执行结果 (纯文本)
     """
-    # MCP 工具路由
-    from backend.services.mcp.tool_adapter import is_mcp_tool
-    if is_mcp_tool(name):
-        from backend.services.mcp.execution_adapter import MCPExecutionAdapter
-        return await MCPExecutionAdapter.execute(
-            tool_name=name,
-            arguments=arguments,
-            workspace=workspace,
-            permissions=permissions,
-            project_id=project_id,
-            workspace_dir=workspace_dir,
-            command_approval_fn=command_approval_fn,
-        )
-
-    perms = permissions or DEFAULT_PERMISSIONS
+    entry = _BUILTIN_DISPATCH.get(name)
+    if entry is None:
+        # MCP 工具路由 (前缀预筛: 其余名称不进入 MCP 判定)
+        if name.startswith(_MCP_TOOL_PREFIX) and _is_mcp_tool_name(name):
+            return await _mcp_execution_adapter().execute(
+                tool_name=name,
+                arguments=arguments,
+                workspace=workspace,
+                permissions=permissions,
+                project_id=project_id,
+                workspace_dir=workspace_dir,
+                command_approval_fn=command_approval_fn,
+            )
+        return _MSG_TOOL_UNKNOWN.format(name)
+    required_perm, executor = entry
 
     # 权限检查
-    required_perm = TOOL_PERMISSION_MAP.get(name)
-    if required_perm and not required_perm.issubset(perms):
-        return f"⚠️ 工具 '{name}' 已被项目管理员禁用"
+    if permissions:
+        perms = permissions
+        denied = bool(required_perm) and not required_perm.issubset(perms)
+    else:
+        perms = DEFAULT_PERMISSIONS
+        denied = name in TOOLS_DENIED_BY_DEFAULT
+    if denied:
+        return _MSG_TOOL_DISABLED.format(name)
 
     # run_command 特殊处理
-    if name == "run_command":
+    if executor is None:
         return await _handle_run_command(arguments, workspace, perms, command_approval_fn)
 
-    # 通用执行
-    executor = _TOOL_EXECUTORS.get(name)
-    if not executor:
-        return f"⚠️ 未知工具: '{name}'"
+    coro = executor(arguments, workspace)
 
-    timeout = COMMAND_TIMEOUT_SECONDS if name == "run_command" else TOOL_TIMEOUT_SECONDS
+    timeout = TOOL_TIMEOUT_SECONDS  # run_command 已在上面单独处理
     try:
-        result = await asyncio.wait_for(executor(arguments, workspace), timeout=timeout)
-        return result
+        return await _run_with_timeout(coro, timeout)
     except asyncio.TimeoutError:
-        return f"⚠️ 工具 '{name}' 执行超时 ({timeout}s)"
+        return _MSG_TOOL_TIMEOUT.format(name, timeout)
     except Exception as e:
         logger.exception(f"工具 {name} 执行失败")
-        return f"⚠️ 工具执行失败: {str(e)}"
+        return _MSG_TOOL_FAILED.format(e)
 
 
 async def _handle_run_command(
@@ -119,71 +210,53 @@ async def _handle_run_command(
     """run_command 路由: 只读 vs 写命令 (审批流)"""
     command = arguments.get("command", "")
 
-    if is_readonly_command(command):
+    if _is_readonly(command):
         # 只读命令: 直接走白名单执行器
         try:
-            result = await asyncio.wait_for(
-                tool_run_command(arguments, workspace),
-                timeout=COMMAND_TIMEOUT_SECONDS,
+            result = await _run_with_timeout(
+                tool_run_command(arguments, workspace), COMMAND_TIMEOUT_SECONDS,
             )
             return result
         except asyncio.TimeoutError:
-            return f"⚠️ 命令执行超时 ({COMMAND_TIMEOUT_SECONDS}s)"
+            return f"{_MSG_COMMAND_TIMEOUT} ({COMMAND_TIMEOUT_SECONDS}s)"
         except Exception as e:
             logger.exception("命令执行失败")
-            return f"⚠️ 命令执行失败: {str(e)}"
+            return _MSG_COMMAND_FAILED.format(e)
 
     # 非只读命令
     if "execute_command" not in perms:
-        return (
-            f"⚠️ 此命令不在只读白名单中，且项目未开启「执行写入命令」权限。\n"
-            f"命令: {command}\n\n"
-            f"只读命令示例: git log, git diff, ls, cat, grep, find, python3 -c 等\n"
-            f"如需执行此命令，请让用户在工具面板中开启「⚠️ 执行写入命令」权限。"
-        )
+        return _MSG_COMMAND_NOT_PERMITTED.format(command)
 
     # 需要审批
     if command_approval_fn:
         approval = await command_approval_fn(command, "")
         if approval.get("approved"):
             try:
-                result = await asyncio.wait_for(
-                    tool_run_command_unrestricted(arguments, workspace),
-                    timeout=COMMAND_TIMEOUT_SECONDS * 2,
+                result = await _run_with_timeout(
+                    tool_run_command_unrestricted(arguments, workspace), COMMAND_TIMEOUT_SECONDS * 2,
                 )
-                scope_label = {
-                    "once": "本次", "session": "本会话",
-                    "project": "本项目", "permanent": "永久", "rule": "规则匹配",
-                }.get(approval.get("scope", ""), "")
-                if scope_label:
-                    return f"✅ 用户已授权执行 ({scope_label})\n\n{result}"
-                return result
+                prefix = _APPROVAL_PREFIXES.get(approval.get("scope", ""))
+                return prefix + result if prefix else result
             except asyncio.TimeoutError:
-                return f"⚠️ 命令执行超时"
+                return _MSG_COMMAND_TIMEOUT
             except Exception as e:
                 logger.exception("命令执行失败")
-                return f"⚠️ 命令执行失败: {str(e)}"
+                return _MSG_COMMAND_FAILED.format(e)
         else:
             reason = approval.get("reason", "用户拒绝")
-            return (
-                f"⚠️ 用户拒绝执行此命令。\n"
-                f"命令: {command}\n"
-                f"原因: {reason}\n\n"
-                f"请改用只读命令获取信息，或向用户解释为什么需要执行此命令后再次尝试。"
-            )
+            return _MSG_COMMAND_REJECTED.format(command, reason)
     else:
         # 无审批回调 — 直接执行
         try:
-            result = await asyncio.wait_for(
-                tool_run_command_unrestricted(arguments, workspace),
-                timeout=COMMAND_TIMEOUT_SECONDS * 2,
+            result = await _run_with_timeout(
+                tool_run_command_unrestricted(arguments, workspace), COMMAND_TIMEOUT_SECONDS * 2,
             )
             return result
         except asyncio.TimeoutError:
-            return f"⚠️ 命令执行超时"
+            return _MSG_COMMAND_TIMEOUT
         except Exception as e:
             logger.exception("命令执行失败")
-            return f"⚠️ 命令执行失败: {str(e)}"
+            return _MSG_COMMAND_FAILED.format(e)
 
 
 async def execute_parallel(
@@ -193,18 +266,19 @@ async def execute_parallel(
     command_approval_fn: CommandApprovalCallback = None,
     project_id: Optional[int] = None,
     workspace_dir: Optional[str] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
 ) -> List[Dict[str, Any]]:
     """
     并行执行多个工具调用
 
     Args:
         calls: [{"name": str, "arguments": dict, "id": str}, ...]
+        on_result: 可选异步回调, 每个调用完成时立即收到其结果 (按完成顺序),
+            快的工具不必等最慢的那个
 
     Returns:
-        [{"id": str, "name": str, "result": str, "duration_ms": int}, ...]
+        [{"id": str, "name": str, "result": str, "duration_ms": int}, ...] (与 calls 顺序一致)
     """
-    import time
-
     async def _exec_one(call: Dict[str, Any]) -> Dict[str, Any]:
         start = time.monotonic()
         try:
@@ -213,7 +287,7 @@ async def execute_parallel(
                 permissions, command_approval_fn, project_id, workspace_dir,
             )
         except Exception as e:
-            result = f"⚠️ 工具执行失败: {str(e)}"
+            result = _MSG_TOOL_FAILED.format(e)
         duration_ms = int((time.monotonic() - start) * 1000)
         return {
             "id": call.get("id", ""),
@@ -222,5 +296,31 @@ async def execute_parallel(
             "duration_ms": duration_ms,
         }
 
-    results = await asyncio.gather(*[_exec_one(c) for c in calls])
-    return list(results)
+    if on_result is None:
+        # 先显式建好 Task 再 gather; return_exceptions: 个别调用异常 (如被单独取消) 不影响其余结果
+        tasks = [asyncio.create_task(_exec_one(c)) for c in calls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return [
+            r if not isinstance(r, BaseException) else {
+                "id": c.get("id", ""),
+                "name": c.get("name", ""),
+                "result": _MSG_TOOL_FAILED.format(str(r) or type(r).__name__),
+                "duration_ms": 0,
+            }
+            for c, r in zip(calls, results)
+        ]
+
+    async def _exec_indexed(index: int, call: Dict[str, Any]):
+        return index, await _exec_one(call)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+    tasks = [asyncio.create_task(_exec_indexed(i, c)) for i, c in enumerate(calls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, result = await next_done
+            results[index] = result
+            await on_result(result)
+    finally:
+        for task in tasks:  # 回调出错 / 被取消时不留下孤儿任务
+            task.cancel()
+    return results
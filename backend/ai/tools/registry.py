@@ -8,8 +8,9 @@ ToolRegistry 管理所有工具源 (builtin / DB / MCP):
 
 单例模式，通过 get_tool_registry() 获取。
 """
+import functools
 import logging
-from typing import Any, Callable, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -25,18 +26,24 @@ TOOL_PERMISSIONS = {
     "execute_command",
 }
 
-DEFAULT_PERMISSIONS = set(TOOL_PERMISSIONS) - {"execute_command"}
+DEFAULT_PERMISSIONS: FrozenSet[str] = frozenset(TOOL_PERMISSIONS - {"execute_command"})
 
 # 工具名 → 所需权限映射 (builtin tools)
-TOOL_PERMISSION_MAP: Dict[str, Set[str]] = {
-    "ask_user": {"ask_user"},
-    "read_file": {"read_source"},
-    "search_text": {"search"},
-    "list_directory": {"tree"},
-    "get_file_tree": {"tree"},
-    "run_command": {"execute_readonly_command"},
+TOOL_PERMISSION_MAP: Dict[str, FrozenSet[str]] = {
+    "ask_user": frozenset({"ask_user"}),
+    "read_file": frozenset({"read_source"}),
+    "search_text": frozenset({"search"}),
+    "list_directory": frozenset({"tree"}),
+    "get_file_tree": frozenset({"tree"}),
+    "run_command": frozenset({"execute_readonly_command"}),
 }
 
+# 默认权限下被禁用的 builtin 工具 (导入时算好: 未指定权限时只需一次成员判断)
+TOOLS_DENIED_BY_DEFAULT: FrozenSet[str] = frozenset(
+    name for name, required in TOOL_PERMISSION_MAP.items()
+    if required and not required.issubset(DEFAULT_PERMISSIONS)
+)
+
 
 # ==================== 工具定义 (OpenAI Function Calling Format) ====================
 
@@ -238,12 +245,13 @@ BUILTIN_TOOL_DEFINITIONS: List[Dict[str, Any]] = [
 # ==================== DB 工具缓存 ====================
 
 _db_tool_cache: Optional[List[Dict[str, Any]]] = None
-_db_perm_map_cache: Optional[Dict[str, Set[str]]] = None
+# 生效的权限映射: builtin 映射 + DB 映射 (同名以 DB 为准); 未从 DB 加载时即 TOOL_PERMISSION_MAP
+_perm_map_cache: Dict[str, FrozenSet[str]] = TOOL_PERMISSION_MAP
 
 
 async def load_tools_from_db():
     """从 DB 加载工具定义到内存缓存 (启动时调用)"""
-    global _db_tool_cache, _db_perm_map_cache
+    global _db_tool_cache, _perm_map_cache
     try:
         from backend.core.database import async_session_maker
         from backend.models import ToolDefinition
@@ -258,7 +266,7 @@ async def load_tools_from_db():
             tools = result.scalars().all()
 
         _db_tool_cache = []
-        _db_perm_map_cache = {}
+        perm_map = dict(TOOL_PERMISSION_MAP)
         for t in tools:
             func_def = t.function_def or {}
             tool_name = func_def.get("name", t.name)
@@ -266,13 +274,28 @@ async def load_tools_from_db():
                 "type": "function",
                 "function": func_def,
             })
-            _db_perm_map_cache[tool_name] = {t.permission_key}
+            perm_map[tool_name] = frozenset((t.permission_key,))
+        _perm_map_cache = perm_map
 
         logger.info(f"✅ 从 DB 加载了 {len(_db_tool_cache)} 个工具定义到缓存")
     except Exception as e:
         logger.warning(f"⚠️ 从 DB 加载工具定义失败, 使用硬编码 fallback: {e}")
         _db_tool_cache = None
-        _db_perm_map_cache = None
+        _perm_map_cache = TOOL_PERMISSION_MAP
+    finally:
+        _permitted_tool_definitions.cache_clear()  # 工具定义 / 权限映射已替换
+
+
+@functools.lru_cache(maxsize=32)
+def _permitted_tool_definitions(perms: FrozenSet[str]) -> Tuple[Dict[str, Any], ...]:
+    """perms 下可用的 builtin / DB 工具定义 (按权限集合缓存, load_tools_from_db 时清空)"""
+    tool_defs = _db_tool_cache if _db_tool_cache is not None else BUILTIN_TOOL_DEFINITIONS
+    tools = []
+    for tool_def in tool_defs:
+        required_perm = _perm_map_cache.get(tool_def["function"]["name"])
+        if required_perm and required_perm.issubset(perms):
+            tools.append(tool_def)
+    return tuple(tools)
 
 
 def get_tool_definitions(permissions: Optional[Set[str]] = None) -> list:
@@ -283,16 +306,7 @@ def get_tool_definitions(permissions: Optional[Set[str]] = None) -> list:
     同时包含已启用的 MCP Server 提供的工具
     """
     perms = permissions or DEFAULT_PERMISSIONS
-
-    tool_defs = _db_tool_cache if _db_tool_cache is not None else BUILTIN_TOOL_DEFINITIONS
-    perm_map = _db_perm_map_cache if _db_perm_map_cache is not None else TOOL_PERMISSION_MAP
-
-    tools = []
-    for tool_def in tool_defs:
-        name = tool_def["function"]["name"]
-        required_perm = perm_map.get(name)
-        if required_perm and required_perm.issubset(perms):
-            tools.append(tool_def)
+    tools = list(_permitted_tool_definitions(frozenset(perms)))
 
     # 追加 MCP 工具
     try:
@@ -84,6 +84,12 @@ class StudioSettings:
     rag_embedding_retry_base_seconds: float = float(os.environ.get("RAG_EMBEDDING_RETRY_BASE_SECONDS", "0.8"))
     rag_batch_delay_seconds: float = float(os.environ.get("RAG_BATCH_DELAY_SECONDS", "2.0"))
 
+    # ── LLM 调用限流 ──
+    llm_max_concurrency: int = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))  # 每个提供商的并发请求上限
+    llm_rate_limit_retry_max: int = int(os.environ.get("LLM_RATE_LIMIT_RETRY_MAX", "2"))
+    llm_rate_limit_max_wait_seconds: float = float(os.environ.get("LLM_RATE_LIMIT_MAX_WAIT_SECONDS", "30"))
+    llm_queue_timeout_seconds: float = float(os.environ.get("LLM_QUEUE_TIMEOUT_SECONDS", "60"))  # 等待并发名额的上限, 0 = 不限
+
     # ── 部署配置 ──
     health_check_timeout: int = 60
     health_check_retries: int = 3
@@ -159,6 +165,10 @@ class StudioSettings:
         self.rag_embedding_retry_max = max(0, int(self.rag_embedding_retry_max or 4))
         self.rag_embedding_retry_base_seconds = max(0.1, float(self.rag_embedding_retry_base_seconds or 0.8))
         self.rag_batch_delay_seconds = max(0.0, float(self.rag_batch_delay_seconds or 2.0))
+        self.llm_max_concurrency = max(1, int(self.llm_max_concurrency or 8))
+        self.llm_rate_limit_retry_max = max(0, int(self.llm_rate_limit_retry_max))
+        self.llm_rate_limit_max_wait_seconds = max(0.0, float(self.llm_rate_limit_max_wait_seconds))
+        self.llm_queue_timeout_seconds = max(0.0, float(self.llm_queue_timeout_seconds))
 
         self.plans_path = os.path.join(self.data_path, "plans")
         self.db_backups_path = os.path.join(self.data_path, "db-backups")
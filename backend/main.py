@@ -78,10 +78,6 @@ async def lifespan(app: FastAPI):
     from backend.api.tools import seed_tools
     await seed_tools()
 
-    # 加载工具定义到内存缓存 (必须在 seed_tools 之后)
-    from backend.services.tool_registry import load_tools_from_db
-    await load_tools_from_db()
-
     # 种子数据: 工作流模块 + 工作流
     from backend.api.workflows import seed_workflow_modules, seed_workflows, load_workflows_to_cache
     await seed_workflow_modules()
@@ -103,8 +99,14 @@ async def lifespan(app: FastAPI):
 
     # MCP 框架初始化
     await seed_mcp_servers()
+
+    # 工具定义 (必须在 seed_tools 之后) 与 MCP Server 配置: 两个互不依赖的只读加载并发进行
+    from backend.services.tool_registry import load_tools_from_db
     from backend.services.mcp.registry import MCPServerRegistry
-    await MCPServerRegistry.get_instance().load_from_db()
+    await asyncio.gather(
+        load_tools_from_db(),
+        MCPServerRegistry.get_instance().load_from_db(),
+    )
 
     # 加载 DB 持久化的系统配置到 settings
     await _load_studio_config()
@@ -163,6 +165,10 @@ async def lifespan(app: FastAPI):
     from backend.services.mcp.client_manager import MCPClientManager
     await MCPClientManager.get_instance().disconnect_all()
 
+    # 关闭 LLM Provider 共享 HTTP 连接池
+    from backend.ai.providers.base import close_shared_clients
+    await close_shared_clients()
+
     logger.info("🐕 Dogi 关闭")
 
 
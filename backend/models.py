@@ -119,7 +119,7 @@ class MemoryItemModel(Base):
     conversation_id = Column(Integer, nullable=True, index=True)      # 来源对话
 
     importance = Column(Float, default=0.5)           # 重要性 0~1
-    embedding = Column(JSON, nullable=True)           # 向量 (JSON array of floats)
+    embedding = Column(JSON, nullable=True)           # 向量 (JSON array, int8 量化; 旧数据为 floats)
     tags = Column(JSON, default=list)                 # 标签
     source = Column(String(50), default="")           # extraction/manual/consolidation/rule
     access_count = Column(Integer, default=0)
@@ -0,0 +1,12 @@
+"""pytest 公共配置: 测试数据目录隔离 + 项目根目录加入 sys.path"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 必须在导入 backend.core.config 之前设置, 避免写入真实的 /data
+os.environ.setdefault("STUDIO_DATA_PATH", tempfile.mkdtemp(prefix="studio-test-"))
+
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[2])
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
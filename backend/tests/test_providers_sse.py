@@ -0,0 +1,175 @@
+"""SSE 解析 (_iter_sse_frames / _iter_sse_events) 与 _open_stream 限流重试"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List
+
+import pytest
+
+from backend.ai.providers import base
+from backend.ai.providers.base import EventType, ProviderBusyError, ProviderInfo
+from backend.ai.providers.github_models import (
+    GitHubModelsProvider,
+    _iter_sse_events,
+    _iter_sse_frames,
+)
+
+
+class _FakeResponse:
+    """按给定分块逐次返回响应体的假 httpx.Response"""
+
+    def __init__(self, chunks: List[bytes], status_code: int = 200, headers=None):
+        self.chunks = chunks
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    async def aiter_bytes(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aread(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+class _FakeClient:
+    """依次返回预置响应的假 AsyncClient"""
+
+    def __init__(self, responses: List[_FakeResponse]):
+        self.responses = list(responses)
+        self.calls = 0
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        self.calls += 1
+        yield self.responses.pop(0)
+
+
+class _CountingSemaphore(asyncio.Semaphore):
+    """记录 acquire / release 次数"""
+
+    def __init__(self, value: int = 1):
+        super().__init__(value)
+        self.acquired = 0
+        self.released = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        return await super().acquire()
+
+    def release(self):
+        self.released += 1
+        super().release()
+
+
+def _delta(text: str) -> bytes:
+    return b'data: {"choices":[{"delta":{"content":"%s"}}]}' % text.encode()
+
+
+async def _collect_frames(response) -> List[List[bytes]]:
+    return [frames async for frames in _iter_sse_frames(response)]
+
+
+async def _collect_events(response):
+    return [event async for event in _iter_sse_events(response)]
+
+
+def test_frame_split_across_reads():
+    line = _delta("hello") + b"\n\n"
+    response = _FakeResponse([line[:7], line[7:20], line[20:]])
+    frames = asyncio.run(_collect_frames(response))
+    assert frames == [[_delta("hello")[6:]]]
+
+
+def test_crlf_and_multiple_data_lines():
+    body = (
+        b": heartbeat\r\n"
+        + _delta("a") + b"\r\n"
+        + _delta("b") + b"\r\n"
+        + b"event: message\r\n\r\n"
+        + _delta("c") + b"\r\n\r\n"
+    )
+    frames = asyncio.run(_collect_frames(_FakeResponse([body])))
+    assert frames == [[_delta("a")[6:], _delta("b")[6:], _delta("c")[6:]]]
+
+    # 同一次读取中的相邻正文增量合并为一个事件
+    events = asyncio.run(_collect_events(_FakeResponse([body])))
+    assert [(e.type, e.text) for e in events] == [(EventType.CONTENT_DELTA, "abc")]
+
+
+def test_done_stops_stream():
+    body = _delta("x") + b"\n\ndata: [DONE]\n\n" + _delta("ignored") + b"\n\n"
+    frames = asyncio.run(_collect_frames(_FakeResponse([body, _delta("late") + b"\n"])))
+    assert frames == [[_delta("x")[6:]]]
+
+
+def test_done_split_and_trailing_frame_without_newline():
+    frames = asyncio.run(_collect_frames(_FakeResponse([b"data: [DO", b"NE]\n"])))
+    assert frames == []
+
+    frames = asyncio.run(_collect_frames(_FakeResponse([_delta("tail")])))
+    assert frames == [[_delta("tail")[6:]]]
+
+
+def test_open_stream_retries_immediate_429():
+    slug = "test-sse-429"
+    provider = GitHubModelsProvider(ProviderInfo(
+        provider_type="github_models",
+        slug=slug,
+        actual_model="gpt-4o",
+        base_url="https://example.invalid",
+    ))
+    client = _FakeClient([
+        _FakeResponse([b'{"error": "rate limited"}'], status_code=429, headers={"retry-after": "0.01"}),
+        _FakeResponse([_delta("ok") + b"\n\ndata: [DONE]\n\n"]),
+    ])
+    provider._get_client = lambda: client
+
+    async def run():
+        sem = base._provider_semaphores[slug] = _CountingSemaphore(1)
+        try:
+            events = [e async for e in provider.stream([{"role": "user", "content": "hi"}], "gpt-4o")]
+        finally:
+            base._provider_semaphores.pop(slug, None)
+        return sem, events
+
+    sem, events = asyncio.run(run())
+    assert client.calls == 2
+    assert [(e.type, e.text) for e in events] == [(EventType.CONTENT_DELTA, "ok")]
+    # 重试期间一直持有同一个名额: 只获取 / 释放一次
+    assert sem.acquired == 1
+    assert sem.released == 1
+    assert not sem.locked()
+
+
+def test_stream_gives_up_when_no_slot_frees_in_time(monkeypatch):
+    from backend.core.config import settings
+
+    slug = "test-sse-busy"
+    provider = GitHubModelsProvider(ProviderInfo(
+        provider_type="github_models",
+        slug=slug,
+        actual_model="gpt-4o",
+        base_url="https://example.invalid",
+    ))
+    client = _FakeClient([_FakeResponse([_delta("ok") + b"\n\ndata: [DONE]\n\n"])])
+    provider._get_client = lambda: client
+    monkeypatch.setattr(settings, "llm_queue_timeout_seconds", 0.05)
+
+    async def run():
+        sem = base._provider_semaphores[slug] = asyncio.Semaphore(1)
+        try:
+            await sem.acquire()  # 唯一的名额被另一个流占用
+            with pytest.raises(ProviderBusyError) as exc_info:
+                async for _ in provider.stream([{"role": "user", "content": "hi"}], "gpt-4o"):
+                    pass
+            assert exc_info.value.error_meta["error_type"] == "rate_limit"
+            assert client.calls == 0
+
+            # 名额在超时前释放: 排队的请求正常完成, 名额随流结束归还
+            asyncio.get_running_loop().call_later(0.01, sem.release)
+            events = [e async for e in provider.stream([{"role": "user", "content": "hi"}], "gpt-4o")]
+            assert [e.text for e in events] == ["ok"]
+            assert not sem.locked()
+        finally:
+            base._provider_semaphores.pop(slug, None)
+
+    asyncio.run(run())
@@ -0,0 +1,117 @@
+"""EmbeddingService.embed_single: 并发单条请求合并为批量 Provider 调用"""
+import asyncio
+
+import pytest
+
+import backend.ai.llm as llm
+from backend.ai.providers.base import ProviderError
+from backend.ai.rag.embeddings import EmbeddingService
+
+
+class _FakeLLMClient:
+    """记录每次 embed 调用的批次; 向量由文本决定, 便于核对调用方拿到的是自己的结果"""
+
+    def __init__(self, error: Exception = None):
+        self.batches = []
+        self.error = error
+
+    async def embed(self, texts, model, provider_slug=""):
+        self.batches.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text)), float(int(text.split("-")[1]))] for text in texts]
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = _FakeLLMClient()
+    monkeypatch.setattr(llm, "get_llm_client", lambda: client)
+    return client
+
+
+def _assert_drained(service: EmbeddingService):
+    assert service._pending == []
+    assert service._flush_task is None
+
+
+def test_concurrent_calls_coalesce_into_one_batch(fake_client):
+    service = EmbeddingService(retry_max=0)
+    texts = [f"text-{i}" for i in range(20)]
+
+    async def run():
+        results = await asyncio.gather(*(service.embed_single(text) for text in texts))
+        await asyncio.sleep(0)  # 让 flush 任务执行完 finally
+        return results
+
+    results = asyncio.run(run())
+    assert fake_client.batches == [texts]
+    assert results == [[float(len(text)), float(i)] for i, text in enumerate(texts)]
+    _assert_drained(service)
+
+
+def test_coalesce_respects_max_batch(fake_client):
+    service = EmbeddingService(retry_max=0)
+    service.COALESCE_MAX_BATCH = 4
+    texts = [f"text-{i}" for i in range(10)]
+
+    async def run():
+        results = await asyncio.gather(*(service.embed_single(text) for text in texts))
+        await asyncio.sleep(0)
+        return results
+
+    results = asyncio.run(run())
+    assert fake_client.batches == [texts[:4], texts[4:8], texts[8:]]
+    assert [vec[1] for vec in results] == [float(i) for i in range(10)]
+    _assert_drained(service)
+
+
+def test_provider_error_falls_back_for_every_caller(fake_client):
+    fake_client.error = ProviderError("boom", status_code=500)
+    service = EmbeddingService(retry_max=0)
+    texts = [f"text-{i} alpha beta" for i in range(5)]
+
+    async def run():
+        results = await asyncio.gather(*(service.embed_single(text) for text in texts))
+        await asyncio.sleep(0)
+        return results
+
+    results = asyncio.run(run())
+    assert len(fake_client.batches) == 1
+    assert results == [service._tfidf_embed(text) for text in texts]
+    _assert_drained(service)
+
+
+def test_batch_exception_propagates_to_all_waiters(fake_client):
+    # embed() 自身会吞掉 Provider 异常并回退 TF-IDF; 批次级异常直接在 embed 处注入
+    service = EmbeddingService(retry_max=0)
+    error = RuntimeError("embed failed")
+    calls = []
+
+    async def failing_embed(texts):
+        calls.append(list(texts))
+        raise error
+
+    service.embed = failing_embed
+
+    async def run():
+        results = await asyncio.gather(
+            *(service.embed_single(f"text-{i}") for i in range(8)), return_exceptions=True,
+        )
+        await asyncio.sleep(0)
+        return results
+
+    results = asyncio.run(run())
+    assert len(calls) == 1 and len(calls[0]) == 8
+    assert all(result is error for result in results)
+    _assert_drained(service)
+
+    # 失败后队列已清空, 后续请求重新起一个 flush 任务
+    service.embed = EmbeddingService.embed.__get__(service)
+
+    async def again():
+        result = await service.embed_single("text-99")
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(again()) == [7.0, 99.0]
+    _assert_drained(service)
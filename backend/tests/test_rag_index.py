@@ -0,0 +1,223 @@
+"""VectorIndex 检索 / 删除 / 持久化"""
+import asyncio
+import random
+
+import numpy as np
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from backend.ai.rag import index as rag_index
+from backend.ai.rag.index import IndexEntry, VectorIndex
+
+DIM = 64
+# int8 量化 (行与查询各自 /127) 引入的余弦误差上界, 未量化时为浮点误差
+TOLERANCE = 0.02 if rag_index._QUANTIZE else 1e-5
+
+
+def _random_entries(n: int, sources=("a.py", "b.py", "c.py"), seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        IndexEntry(
+            id=f"e{i}",
+            content=f"chunk {i}",
+            embedding=[rng.gauss(0, 1) for _ in range(DIM)],
+            source=sources[i % len(sources)],
+            metadata={"i": i},
+        )
+        for i in range(n)
+    ]
+
+
+def _brute_force(query, entries):
+    q = np.asarray(query, dtype=np.float64)
+    q /= np.linalg.norm(q)
+    scores = {}
+    for entry in entries:
+        v = np.asarray(entry.embedding, dtype=np.float64)
+        scores[entry.id] = float(v @ q / np.linalg.norm(v))
+    return scores
+
+
+def _assert_matches_brute_force(index: VectorIndex, entries, query, top_k: int):
+    exact = _brute_force(query, entries)
+    results = index.search(query, top_k=top_k)
+    assert results
+    for entry, score in results:
+        assert score == pytest.approx(exact[entry.id], abs=TOLERANCE)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    # 明显高于第 k 名的条目必须全部召回 (差距小于量化误差的可以互换)
+    returned = {entry.id for entry, _ in results}
+    kth = scores[-1] if len(results) == top_k else 0.0
+    for entry_id, score in exact.items():
+        if score > kth + 2 * TOLERANCE:
+            assert entry_id in returned
+
+
+def test_search_matches_brute_force_cosine():
+    entries = _random_entries(300)
+    index = VectorIndex()
+    for entry in entries:
+        index.upsert(entry)
+
+    rng = random.Random(1)
+    for _ in range(10):
+        query = [rng.gauss(0, 1) for _ in range(DIM)]
+        _assert_matches_brute_force(index, entries, query, top_k=10)
+
+    # 以条目自身为查询: 第一名是它自己
+    entry, score = index.search(entries[42].embedding, top_k=1)[0]
+    assert entry.id == "e42"
+    assert score == pytest.approx(1.0, abs=TOLERANCE)
+
+
+def test_remove_by_source_then_search():
+    entries = _random_entries(90)
+    index = VectorIndex()
+    for entry in entries:
+        index.upsert(entry)
+
+    assert index.remove_by_source("b.py") == 30
+    assert index.size == 60
+    assert index.source_entries("b.py") == []
+    remaining = [entry for entry in entries if entry.source != "b.py"]
+
+    rng = random.Random(2)
+    for _ in range(5):
+        query = [rng.gauss(0, 1) for _ in range(DIM)]
+        results = index.search(query, top_k=60)
+        assert all(entry.source != "b.py" for entry, _ in results)
+        _assert_matches_brute_force(index, remaining, query, top_k=10)
+
+    # 被删除条目自身作为查询时不再命中
+    removed = entries[1]
+    assert removed.source == "b.py"
+    assert all(entry.id != removed.id for entry, _ in index.search(removed.embedding, top_k=5))
+    # 来源过滤: 只返回对应文件的条目
+    filtered = index.search(entries[0].embedding, top_k=5, source_filter="a.py")
+    assert filtered[0][0].id == "e0"
+    assert all(entry.source == "a.py" for entry, _ in filtered)
+    assert index.search(entries[0].embedding, top_k=5, source_filter="b.py") == []
+
+
+async def _load(session_maker) -> VectorIndex:
+    index = VectorIndex()
+    async with session_maker() as session:
+        await index.load_from_db(session)
+    return index
+
+
+def _snapshot(index: VectorIndex):
+    return {
+        entry.id: (entry.content, entry.source, entry.metadata, list(np.asarray(entry.embedding, dtype=np.float32)))
+        for entry in index._entries
+    }
+
+
+def test_save_load_roundtrip_with_incremental_delete(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'rag.db'}")
+        session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            entries = _random_entries(40)
+            index = VectorIndex()
+            for entry in entries:
+                index.upsert(entry)
+            async with session_maker() as session:
+                await index.save_to_db(session)
+
+            loaded = await _load(session_maker)
+            assert loaded.size == 40
+            assert _snapshot(loaded) == _snapshot(index)
+            query = entries[5].embedding
+            before, after = index.search(query, 5), loaded.search(query, 5)
+            assert [e.id for e, _ in after] == [e.id for e, _ in before]
+            # 写入时由 float64 量化, 加载时由 float32 BLOB 量化: 得分只在误差范围内一致
+            assert [s for _, s in after] == pytest.approx([s for _, s in before], abs=TOLERANCE)
+
+            # 增量保存: 删除一个来源 + 删除单条 + 更新一条, 只写变更行
+            assert loaded.remove_by_source("c.py") == 13
+            loaded.remove("e0")
+            updated = IndexEntry(id="e1", content="updated", embedding=entries[3].embedding, source="b.py")
+            loaded.upsert(updated)
+            assert not loaded._cleared
+            async with session_maker() as session:
+                await loaded.save_to_db(session)
+            assert not loaded._changed_ids and not loaded._removed_ids
+
+            reloaded = await _load(session_maker)
+            assert reloaded.size == 40 - 13 - 1
+            assert _snapshot(reloaded) == _snapshot(loaded)
+            assert "e0" not in reloaded._id_map
+            assert reloaded.source_entries("c.py") == []
+            assert reloaded._entries[reloaded._id_map["e1"]].content == "updated"
+            hits = reloaded.search(entries[3].embedding, top_k=2)
+            assert {entry.id for entry, _ in hits} == {"e1", "e3"}
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_search_recovers_after_embedding_dimension_upgrade():
+    # TF-IDF (256 维) 索引升级为 Provider 向量 (1536 维): 旧条目删完后矩阵应切换到新维度
+    rng = random.Random(3)
+    index = VectorIndex()
+    index.upsert(IndexEntry(id="old", content="old", embedding=[rng.random() for _ in range(256)], source="old.md"))
+    new_entries = [
+        IndexEntry(id=f"new{i}", content=f"new {i}", embedding=[rng.gauss(0, 1) for _ in range(1536)], source="new.md")
+        for i in range(5)
+    ]
+    for entry in new_entries:
+        index.upsert(entry)
+
+    assert index.remove_by_source("old.md") == 1
+    if rag_index.HAS_NUMPY:
+        assert index._matrix.dim == 1536
+    results = index.search(new_entries[2].embedding, top_k=5)
+    assert results[0][0].id == "new2"
+    assert results[0][1] == pytest.approx(1.0, abs=TOLERANCE)
+    _assert_matches_brute_force(index, new_entries, [rng.gauss(0, 1) for _ in range(1536)], top_k=3)
+
+
+def test_inplace_reembedding_switches_matrix_dimension():
+    # 同一批 chunk id 重新索引为新维度向量 (原地 upsert), 最后一条替换后即可检索
+    rng = random.Random(4)
+    index = VectorIndex()
+    for i in range(4):
+        index.upsert(IndexEntry(id=f"c{i}", content="x", embedding=[rng.random() for _ in range(256)], source="a.md"))
+    upgraded = [
+        IndexEntry(id=f"c{i}", content="x", embedding=[rng.gauss(0, 1) for _ in range(DIM)], source="a.md")
+        for i in range(4)
+    ]
+    for entry in upgraded:
+        index.upsert(entry)
+
+    assert index.size == 4
+    entry, score = index.search(upgraded[1].embedding, top_k=1)[0]
+    assert entry.id == "c1"
+    assert score == pytest.approx(1.0, abs=TOLERANCE)
+
+
+def test_load_with_mixed_dimensions_uses_majority(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'rag.db'}")
+        session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            rng = random.Random(5)
+            index = VectorIndex()
+            index.upsert(IndexEntry(id="a-old", content="old", embedding=[rng.random() for _ in range(256)]))
+            entries = _random_entries(6)
+            for entry in entries:
+                index.upsert(entry)
+            async with session_maker() as session:
+                await index.save_to_db(session)
+            return await _load(session_maker), entries
+        finally:
+            await engine.dispose()
+
+    loaded, entries = asyncio.run(run())
+    assert loaded.size == 7
+    if rag_index.HAS_NUMPY:
+        assert loaded._matrix.dim == DIM
+    assert loaded.search(entries[4].embedding, top_k=1)[0][0].id == "e4"
@@ -0,0 +1,42 @@
+"""Tracer: 写入线程的数据库连接与超时 span 回收"""
+import os
+import time
+
+from backend.ai.observability.tracer import Tracer, TraceType
+
+
+def test_writer_connects_to_engine_database():
+    from backend.core.database import engine
+
+    conn = Tracer._connect()
+    try:
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+        assert path == os.path.abspath(engine.url.database)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'ai_traces'").fetchone()
+    finally:
+        conn.close()
+
+
+def test_end_after_expire_overwrites_instead_of_duplicating():
+    tracer = Tracer()
+    span = tracer.start_span(TraceType.LLM_CALL, name="chat", model_id="gpt-4o")
+    other = tracer.start_span(TraceType.LLM_CALL, name="chat", model_id="gpt-4o")
+
+    assert tracer._expire_spans([span.span_id], time.time()) == 1
+    assert tracer.get_recent()[0]["status"] == "timeout"
+
+    tracer.end_span(span, prompt_tokens=10, completion_tokens=5)
+    tracer.end_span(other, prompt_tokens=1, completion_tokens=1)
+
+    stats = tracer.get_stats()
+    assert stats["total_calls"] == 2
+    assert stats["total_tokens"] == 17
+    assert [s["status"] for s in tracer.get_recent()] == ["ok", "ok"]
+    assert not tracer._active_spans
+
+    # timeout 行与正常结束的结果都交给写入线程: 后者按 span_id 覆盖前者
+    queued = []
+    while not tracer._write_queue.empty():
+        queued.append(tracer._write_queue.get_nowait())
+    assert [s.span_id for s in queued] == [span.span_id, span.span_id, other.span_id]
+    assert queued[1].status == "ok" and queued[1].total_tokens == 15